@@ -0,0 +1,149 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+import numpy as np
+from aiohttp import web
+
+from services.batching import BatchedQueryEmbeddings
+from services import clients
+from services.pipeline import get_pipeline
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "16"))
+# Requests allowed to wait for a worker slot before new ones are rejected with 503.
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "64"))
+LATENCY_WINDOW = 1000
+
+
+class ServerMetrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.latencies = {}
+
+    def observe(self, timings: dict):
+        for stage, seconds in timings.items():
+            self.latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def as_dict(self) -> dict:
+        latency = {}
+        for stage, values in self.latencies.items():
+            p50, p95 = np.percentile(list(values), [50, 95])
+            latency[stage] = {"p50_ms": round(1000 * p50, 1), "p95_ms": round(1000 * p95, 1), "count": len(values)}
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "latency": latency,
+        }
+
+
+def serialize_chunk(doc) -> dict:
+    return {"page_content": doc.page_content, "metadata": {k: v for k, v in doc.metadata.items() if not k.startswith("_")}}
+
+
+async def _read_query(request: web.Request) -> str:
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "invalid JSON"}), content_type="application/json")
+    query = (body.get("query") or "").strip()
+    if not query:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "query is required"}), content_type="application/json")
+    return query
+
+
+class _Slot:
+    def __init__(self, app: web.Application):
+        self.app = app
+
+    async def __aenter__(self):
+        metrics = self.app["metrics"]
+        if metrics.queued >= self.app["max_queue"]:
+            metrics.rejected += 1
+            raise web.HTTPServiceUnavailable(
+                text=json.dumps({"error": "server busy"}), content_type="application/json", headers={"Retry-After": "1"}
+            )
+        metrics.queued += 1
+        try:
+            await self.app["semaphore"].acquire()
+        finally:
+            metrics.queued -= 1
+        metrics.in_flight += 1
+        metrics.requests += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        metrics = self.app["metrics"]
+        metrics.in_flight -= 1
+        if exc_type is not None and not isinstance(exc, web.HTTPException):
+            metrics.errors += 1
+        self.app["semaphore"].release()
+
+
+async def handle_answer(request: web.Request) -> web.Response:
+    query = await _read_query(request)
+    async with _Slot(request.app):
+        result = await request.app["pipeline"].answer(query)
+    request.app["metrics"].observe(result["timings"])
+    return web.json_response({
+        "answer": result["answer"],
+        "cached": result["cached"],
+        "timings": result["timings"],
+        "chunks": [serialize_chunk(doc) for doc in result["chunks"]],
+    })
+
+
+async def handle_answer_stream(request: web.Request) -> web.StreamResponse:
+    query = await _read_query(request)
+    async with _Slot(request.app):
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        async for event in request.app["pipeline"].answer_stream(query):
+            if event["type"] == "chunks":
+                event = {**event, "chunks": [serialize_chunk(doc) for doc in event["chunks"]]}
+            elif event["type"] == "done":
+                request.app["metrics"].observe(event["timings"])
+            await response.write((json.dumps(event) + "\n").encode("utf-8"))
+        await response.write_eof()
+    return response
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    metrics = request.app["metrics"]
+    return web.json_response({"status": "ok", "in_flight": metrics.in_flight, "queued": metrics.queued})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.json_response(request.app["metrics"].as_dict())
+
+
+def create_app(pipeline=None, max_concurrency: int = API_MAX_CONCURRENCY, max_queue: int = API_MAX_QUEUE) -> web.Application:
+    app = web.Application()
+    app["pipeline"] = pipeline or get_pipeline(embeddings=BatchedQueryEmbeddings(clients.get_embeddings()))
+    app["semaphore"] = asyncio.Semaphore(max_concurrency)
+    app["max_queue"] = max_queue
+    app["metrics"] = ServerMetrics()
+    app.router.add_post("/answer", handle_answer)
+    app.router.add_post("/answer/stream", handle_answer_stream)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=os.getenv("API_HOST", "0.0.0.0"), port=int(os.getenv("API_PORT", "8000")))
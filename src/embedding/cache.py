@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_memory_items: int = 50_000):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, task_type, text_hash)
+            )"""
+        )
+        self._conn.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, task_type: str, texts: list[str]) -> dict:
+        found = {}
+        to_load = {}
+        with self._lock:
+            for text in texts:
+                key = (model, task_type, text_hash(text))
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[text] = self._memory[key]
+                else:
+                    to_load[key[2]] = text
+
+            hashes = list(to_load)
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i+500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND task_type = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, task_type, *chunk],
+                ).fetchall()
+                for h, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember((model, task_type, h), vector)
+                    found[to_load[h]] = vector
+                    self.disk_hits += 1
+        return found
+
+    def put_many(self, model: str, task_type: str, items) -> None:
+        rows = []
+        with self._lock:
+            for text, vector in items:
+                h = text_hash(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember((model, task_type, h), vector)
+                rows.append((model, task_type, h, vector.tobytes()))
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def record(self, hits: int = 0, misses: int = 0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get_or_compute(self, model: str, task_type: str, texts: list[str], compute) -> np.ndarray:
+        found = self.get_many(model, task_type, texts)
+        missing = [t for t in dict.fromkeys(texts) if t not in found]
+        self.record(hits=len(texts) - len(missing), misses=len(missing))
+        if missing:
+            vectors = compute(missing)
+            self.put_many(model, task_type, zip(missing, vectors))
+            found.update(zip(missing, vectors))
+        return np.stack([found[t] for t in texts]) if texts else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "memory_items": len(self._memory),
+        }
+
+    def log_stats(self):
+        logging.info(f"Embedding cache stats: {self.stats()}")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> EmbeddingCache:
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
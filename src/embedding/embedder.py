@@ -1,7 +1,10 @@
+import asyncio
 from langchain.embeddings.base import Embeddings
 from sentence_transformers import SentenceTransformer
 from google.genai import types
 from services.gemini import client as gemini_client
+from services.rate_limit import TokenBucket, acall_with_retry, call_with_retry
+from embedding.cache import EmbeddingCache, get_default_cache
 from langfuse import observe
 import os
 from dotenv import load_dotenv
@@ -21,6 +24,8 @@ from langchain_community.vectorstores import FAISS
 import torch
 from sentence_transformers import CrossEncoder
 from typing import List, Callable, Any, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 
 class VertexAIChat(BaseChatModel, BaseModel):
@@ -75,44 +80,100 @@ class VertexAIChat(BaseChatModel, BaseModel):
 
 
 class GeminiEmbeddings(Embeddings):
-    def __init__(self, client=gemini_client, model: str = "text-embedding-004"):
+    def __init__(
+        self,
+        client=gemini_client,
+        model: str = "text-embedding-004",
+        batch_size: int = 100,
+        max_concurrency: int = 8,
+        requests_per_second: float = 10.0,
+        max_retries: int = 5,
+        cache: Optional[EmbeddingCache] = None,
+        use_cache: bool = True,
+    ):
         self.client = client
         self.model = model
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(requests_per_second)
+        self.cache = (cache or get_default_cache()) if use_cache else None
+
+    def _embed_batch(self, batch: list[str], task_type: str) -> np.ndarray:
+        response = call_with_retry(
+            self.client.models.embed_content,
+            model=self.model,
+            contents=batch,
+            config=types.EmbedContentConfig(task_type=task_type),
+            bucket=self.bucket,
+            max_retries=self.max_retries,
+        )
+        return np.asarray([e.values for e in response.embeddings], dtype=np.float32)
+
+    def _embed_cached(self, texts: list[str], task_type: str, compute) -> np.ndarray:
+        if self.cache is None:
+            return compute(texts)
+        return self.cache.get_or_compute(self.model, task_type, texts, compute)
 
     @observe(as_type="embedding")
+    def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        return self._embed_cached(texts, "RETRIEVAL_DOCUMENT", self._embed_documents_uncached)
+
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        batch_size = 16
-        embeddings = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i+batch_size]
-            responses = [
-                self.client.models.embed_content(
-                    model=self.model,
-                    contents={"parts": [{"text": text}]},
-                    config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
-                )
-                for text in batch
-            ]
-            embeddings.extend([r.embeddings[0].values for r in responses])
-        return embeddings
-    
+        return self.embed_documents_array(texts).tolist()
+
+    def _embed_documents_uncached(self, texts: list[str]) -> np.ndarray:
+        batches = [texts[i:i+self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+            return np.concatenate(list(pool.map(lambda batch: self._embed_batch(batch, "RETRIEVAL_DOCUMENT"), batches)))
+
     @observe(as_type="embedding")
     def embed_query(self, text: str) -> list[float]:
-        response = self.client.models.embed_content(
-            model=self.model,
-            contents={"parts": [{"text": text}]},
-            config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
-        )
-        return response.embeddings[0].values
+        return self._embed_cached([text], "RETRIEVAL_QUERY", lambda texts: self._embed_batch(texts, "RETRIEVAL_QUERY"))[0].tolist()
+
+    async def aembed_queries(self, texts: list[str]) -> np.ndarray:
+        found = await asyncio.to_thread(self.cache.get_many, self.model, "RETRIEVAL_QUERY", texts) if self.cache is not None else {}
+        missing = [t for t in dict.fromkeys(texts) if t not in found]
+        if self.cache is not None:
+            self.cache.record(hits=len(texts) - len(missing), misses=len(missing))
+        if missing:
+            response = await acall_with_retry(
+                self.client.aio.models.embed_content,
+                model=self.model,
+                contents=missing,
+                config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY"),
+                bucket=self.bucket,
+                max_retries=self.max_retries,
+            )
+            vectors = np.asarray([e.values for e in response.embeddings], dtype=np.float32)
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put_many, self.model, "RETRIEVAL_QUERY", list(zip(missing, vectors)))
+            found.update(zip(missing, vectors))
+        return np.stack([found[t] for t in texts])
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        return (await self.aembed_queries([text]))[0]
 
 
 class SentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
+    def __init__(self, model_name="all-MiniLM-L6-v2", cache: Optional[EmbeddingCache] = None, use_cache: bool = True):
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
+        self.cache = (cache or get_default_cache()) if use_cache else None
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True).astype(np.float32)
+
+    def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        if self.cache is None:
+            return self._encode(texts)
+        return self.cache.get_or_compute(self.model_name, "default", texts, self._encode)
 
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return self.model.encode(texts, convert_to_numpy=True).tolist()
+        return self.embed_documents_array(texts).tolist()
 
     def embed_query(self, text: str) -> list[float]:
-        return self.model.encode(text, convert_to_numpy=True).tolist()
+        return self.embed_documents([text])[0]
 
@@ -0,0 +1,125 @@
+import hashlib
+import io
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from PIL import Image
+from langchain.schema import Document
+
+from embedding.incremental import point_id
+from embedding.pipeline_stats import PipelineStats
+from services.gemini import summarize_image
+from services.rate_limit import TokenBucket, call_with_retry
+from services.summary_cache import SummaryCache, make_key
+
+IMAGE_SUMMARY_WORKERS = 4
+IMAGE_SUMMARY_RPS = 2.0
+# Longest side in pixels sent to the model; docling exports pictures at 2x scale.
+IMAGE_MAX_SIDE = 1024
+IMAGE_FORMAT = "PNG"
+
+
+def load_image_entries(figures_json_path: str) -> list[dict]:
+    with open(figures_json_path, "r") as f:
+        image_metadata = json.load(f)
+
+    entries = []
+    for image_obj in image_metadata:
+        try:
+            image_path = Path(image_obj["image_path"])
+            image_bytes = image_path.read_bytes()
+        except Exception as e:
+            print(f"Error on image: {image_obj.get('image_path')}: {e}")
+            continue
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        entries.append({
+            "pid": point_id("images", content_hash + json.dumps(image_obj, sort_keys=True)),
+            "content_hash": content_hash,
+            "image_path": image_path,
+            "image_bytes": image_bytes,
+            "title": image_obj.get("title", "Unknown"),
+            "metadata": {
+                "title": image_obj.get("title", "Unknown"),
+                "page": image_obj.get("page_number", -1),
+                "section": image_obj.get("section_title", "Unknown"),
+                "type": "image",
+                "content": image_obj.get("content", "Unknown"),
+                "image_path": str(image_path),
+            },
+        })
+    return entries
+
+
+def prepare_image(image_bytes: bytes, max_side: int = IMAGE_MAX_SIDE, image_format: str = IMAGE_FORMAT):
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    decoded = time.perf_counter()
+
+    if max(image.size) <= max_side and image.format == image_format:
+        encoded_bytes = image_bytes
+    else:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, optimize=True, **({"quality": 85} if image_format == "JPEG" else {}))
+        encoded_bytes = buffer.getvalue()
+    encoded = time.perf_counter()
+
+    timings = {"decode": decoded - start, "encode": encoded - decoded}
+    return encoded_bytes, f"image/{image_format.lower()}", timings
+
+
+def stream_image_documents(
+    entries: list[dict],
+    max_workers: int = IMAGE_SUMMARY_WORKERS,
+    requests_per_second: float = IMAGE_SUMMARY_RPS,
+    max_side: int = IMAGE_MAX_SIDE,
+    image_format: str = IMAGE_FORMAT,
+    cache: SummaryCache = None,
+    stats: PipelineStats = None,
+):
+    cache = cache or SummaryCache("images")
+    stats = stats or PipelineStats(len(entries), name="Image summarization")
+    bucket = TokenBucket(requests_per_second)
+
+    pending = []
+    for entry in entries:
+        entry["cache_key"] = make_key(entry["content_hash"], entry["title"])
+        summary = cache.get(entry["cache_key"])
+        if summary is not None:
+            stats.record(cached=True)
+            yield entry["pid"], Document(page_content=summary, metadata=entry["metadata"])
+        else:
+            pending.append(entry)
+
+    def summarize(entry):
+        image_bytes, mime_type, timings = prepare_image(entry["image_bytes"], max_side, image_format)
+        start = time.perf_counter()
+        summary = call_with_retry(summarize_image, image_bytes, entry["title"], mime_type, bucket=bucket)
+        timings["upload"] = time.perf_counter() - start
+        for stage, seconds in timings.items():
+            stats.add_timing(stage, seconds)
+        logging.info(
+            f"{entry['image_path'].name}: {len(entry['image_bytes']) // 1024} KB -> {len(image_bytes) // 1024} KB, "
+            + ", ".join(f"{stage} {1000 * seconds:.0f} ms" for stage, seconds in timings.items())
+        )
+        cache.put(entry["cache_key"], summary)
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(summarize, entry): entry for entry in pending}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                logging.error(f"Error on image: {entry['image_path']}: {e}")
+                stats.record(llm_calls=1, failed=True)
+                continue
+            stats.record(llm_calls=1)
+            yield entry["pid"], Document(page_content=summary, metadata=entry["metadata"])
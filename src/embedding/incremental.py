@@ -0,0 +1,281 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain.schema import Document
+from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    PayloadSchemaType,
+    PointIdsList,
+)
+
+from embedding.vector_profiles import VECTOR_PROFILE, collection_params, get_profile
+
+MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "./cache/index_manifest.json")
+UPSERT_BATCH_SIZE = 256
+PAYLOAD_INDEXES = {
+    "metadata.page": PayloadSchemaType.INTEGER,
+    "metadata.type": PayloadSchemaType.KEYWORD,
+    "metadata.section": PayloadSchemaType.KEYWORD,
+    "metadata.content": PayloadSchemaType.KEYWORD,
+}
+
+
+def point_id(source: str, key: str) -> str:
+    digest = hashlib.sha256(f"{source}\x00{key}".encode("utf-8")).hexdigest()
+    return str(uuid.UUID(digest[:32]))
+
+
+def document_key(doc: Document) -> str:
+    return doc.page_content + "\x00" + json.dumps(doc.metadata, sort_keys=True, default=str)
+
+
+def index_schema(profile: dict) -> dict:
+    # Changing any of these needs a new collection; anything else is upserted in place.
+    return {"profile": profile, "payload_indexes": {field: schema.value for field, schema in PAYLOAD_INDEXES.items()}}
+
+
+def content_revision(manifest: dict) -> str:
+    ids = sorted(pid for ids in manifest["sources"].values() for pid in ids)
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:12]
+
+
+class IncrementalIndexer:
+    def __init__(self, client, embedding_model, alias: str, manifest_path: str = MANIFEST_PATH, keyword_index=None, profile: str = VECTOR_PROFILE):
+        self.client = client
+        self.embedding_model = embedding_model
+        self.alias = alias
+        self.profile = get_profile(profile)
+        self.schema = index_schema(self.profile)
+        self.keyword_index = keyword_index
+        self._written_docs = {}
+        self.manifest_path = Path(manifest_path)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> dict:
+        if self.manifest_path.exists():
+            data = json.loads(self.manifest_path.read_text())
+        else:
+            data = {}
+        return data.get(self.alias, {"collection": None, "sources": {}})
+
+    def _save_manifest(self):
+        data = json.loads(self.manifest_path.read_text()) if self.manifest_path.exists() else {}
+        data[self.alias] = self.manifest
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, indent=2))
+        tmp_path.replace(self.manifest_path)
+
+    def _alias_target(self):
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.alias:
+                return alias.collection_name
+        return None
+
+    def _live_collection(self):
+        target = self._alias_target()
+        if target is None or target != self.manifest["collection"]:
+            return None
+        return target
+
+    def indexed_ids(self) -> set:
+        if self._live_collection() is None:
+            return set()
+        return {pid for ids in self.manifest["sources"].values() for pid in ids}
+
+    def missing(self, ids: list[str]) -> list[str]:
+        indexed = self.indexed_ids()
+        return [pid for pid in ids if pid not in indexed]
+
+    def _copy_points(self, source_collection: str, target_collection: str, ids: list[str]):
+        for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+            records = self.client.retrieve(
+                collection_name=source_collection,
+                ids=ids[i:i+UPSERT_BATCH_SIZE],
+                with_payload=True,
+                with_vectors=True,
+            )
+            if not records:
+                continue
+            self.client.upload_collection(
+                collection_name=target_collection,
+                vectors=np.asarray([r.vector for r in records], dtype=np.float32),
+                payload=[r.payload for r in records],
+                ids=[r.id for r in records],
+                batch_size=UPSERT_BATCH_SIZE,
+                wait=True,
+            )
+
+    def _upsert_documents(self, collection: str, wanted: set, documents, written: list) -> list[str]:
+        """Appends ids to `written` as batches land, so callers still know them if `documents` raises."""
+        items = documents.items() if isinstance(documents, dict) else documents
+        batch = []
+        for pid, doc in items:
+            if pid not in wanted:
+                continue
+            batch.append((pid, doc))
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                written.extend(self._upsert_batch(collection, batch))
+                batch = []
+        if batch:
+            written.extend(self._upsert_batch(collection, batch))
+        return written
+
+    def _upsert_batch(self, collection: str, batch: list) -> list[str]:
+        texts = [doc.page_content for _, doc in batch]
+        if hasattr(self.embedding_model, "embed_documents_array"):
+            vectors = self.embedding_model.embed_documents_array(texts)
+        else:
+            vectors = np.asarray(self.embedding_model.embed_documents(texts), dtype=np.float32)
+        self.client.upload_collection(
+            collection_name=collection,
+            vectors=vectors,
+            payload=[{"page_content": doc.page_content, "metadata": doc.metadata} for _, doc in batch],
+            ids=[pid for pid, _ in batch],
+            batch_size=UPSERT_BATCH_SIZE,
+            wait=True,
+        )
+        if self.keyword_index is not None:
+            self._written_docs.update(batch)
+        return [pid for pid, _ in batch]
+
+    def _delete_points(self, collection: str, ids: list[str]):
+        for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+            self.client.delete(collection_name=collection, points_selector=PointIdsList(points=ids[i:i+UPSERT_BATCH_SIZE]), wait=True)
+
+    def _flush(self):
+        # The local index persists on flush; Qdrant has already applied the writes (wait=True).
+        if hasattr(self.client, "flush"):
+            self.client.flush()
+
+    def _create_collection(self, name: str):
+        vector_size = len(self.embedding_model.embed_query("sample text"))
+        self.client.create_collection(collection_name=name, **collection_params(self.profile, vector_size))
+        for field_name, schema in PAYLOAD_INDEXES.items():
+            self.client.create_payload_index(collection_name=name, field_name=field_name, field_schema=schema, wait=True)
+
+    def _switch_alias(self, new_collection: str):
+        operations = []
+        if self._alias_target() is not None:
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.alias)))
+        elif self.client.collection_exists(self.alias):
+            # One-off migration from the old plain collection: aliases cannot shadow a collection name.
+            logging.warning(f"Replacing legacy collection '{self.alias}' with an alias")
+            self.client.delete_collection(collection_name=self.alias)
+        operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=new_collection, alias_name=self.alias)))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+
+    def sync(self, source: str, ids: list[str], documents) -> dict:
+        """`documents` is a dict or an iterable of (point_id, Document) pairs; pairs are
+        embedded and upserted in batches as they arrive, so it can be a generator."""
+        ids = list(dict.fromkeys(ids))
+        live_collection = self._live_collection()
+        if live_collection is None:
+            self.manifest = {"collection": None, "sources": {}}
+
+        previous = set(self.manifest["sources"].get(source, []))
+        stale = previous - set(ids)
+        to_add = [pid for pid in ids if pid not in previous]
+        stats = {"source": source, "added": len(to_add), "removed": len(stale), "unchanged": len(ids) - len(to_add)}
+        rebuild = live_collection is None or self.manifest.get("schema") != self.schema
+
+        if not rebuild and not to_add and not stale:
+            logging.info(f"Index '{self.alias}' already up to date for '{source}': {stats}")
+            if self.keyword_index is not None and self.keyword_index.collection != live_collection:
+                self.keyword_index.rebuild(self.client, live_collection)
+                self.keyword_index.save()
+            return stats
+
+        self._written_docs = {}
+        written = []
+        if rebuild:
+            collection = self._rebuild(live_collection, stale, to_add, documents, written)
+        else:
+            collection = live_collection
+            try:
+                self._upsert_documents(collection, set(to_add), documents, written)
+            except Exception:
+                # Keep what already landed on record so the next sync neither re-embeds nor orphans it.
+                self._flush()
+                self._record_source(source, [pid for pid in ids if pid in previous] + written + sorted(stale), live_collection, collection, set())
+                raise
+            self._delete_points(collection, sorted(stale))
+            self._flush()
+
+        not_written = len(to_add) - len(written)
+        if not_written:
+            logging.warning(f"{not_written} new point(s) for '{source}' had no document and were skipped")
+        stats["added"] = len(written)
+
+        written = set(written)
+        self._record_source(source, [pid for pid in ids if pid in previous or pid in written], live_collection, collection, stale)
+        logging.info(f"Index '{self.alias}' ({collection}) synced for '{source}': {stats}")
+        return stats
+
+    def _rebuild(self, live_collection, stale: set, to_add: list, documents, written: list) -> str:
+        """Blue/green copy for a new profile or payload schema: readers keep the old collection until the alias moves."""
+        stamp = int(time.time() * 1000)
+        while self.client.collection_exists(f"{self.alias}_{stamp}"):
+            stamp += 1
+        new_collection = f"{self.alias}_{stamp}"
+        try:
+            self._create_collection(new_collection)
+            if live_collection is not None:
+                keep = [pid for pid in self.indexed_ids() if pid not in stale]
+                self._copy_points(live_collection, new_collection, keep)
+            self._upsert_documents(new_collection, set(to_add), documents, written)
+        except Exception:
+            logging.warning(f"Sync into '{new_collection}' failed, deleting it")
+            if self.client.collection_exists(new_collection):
+                self.client.delete_collection(collection_name=new_collection)
+            raise
+
+        self._switch_alias(new_collection)
+        if live_collection is not None:
+            self.client.delete_collection(collection_name=live_collection)
+        logging.info(f"Index '{self.alias}' now points to '{new_collection}'")
+        return new_collection
+
+    def _record_source(self, source: str, ids: list[str], previous_collection, collection: str, stale: set):
+        self.manifest["collection"] = collection
+        self.manifest["schema"] = self.schema
+        self.manifest["sources"][source] = ids
+        self._save_manifest()
+        if self.keyword_index is not None:
+            self._sync_keyword_index(previous_collection, collection, stale)
+
+    def _sync_keyword_index(self, previous_collection, new_collection: str, stale: set):
+        if previous_collection is not None and self.keyword_index.collection == previous_collection:
+            self.keyword_index.update(new_collection, self._written_docs, stale)
+        else:
+            # The keyword index does not mirror the old collection (first run or built before it existed).
+            self.keyword_index.rebuild(self.client, new_collection)
+        self.keyword_index.save()
+        self._written_docs = {}
+
+
+def collection_version(client, alias: str, manifest_path: str = MANIFEST_PATH) -> str:
+    """Changes whenever the indexed content does; syncs upsert in place, so the collection name alone does not."""
+    collection = alias
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            collection = description.collection_name
+    path = Path(manifest_path)
+    manifest = json.loads(path.read_text()).get(alias) if path.exists() else None
+    if manifest is not None and manifest.get("collection") == collection:
+        return f"{collection}@{content_revision(manifest)}"
+    try:
+        return f"{collection}@{client.count(collection_name=collection, exact=True).count}"
+    except (UnexpectedResponse, ValueError):
+        # Nothing indexed yet.
+        return collection
@@ -1,113 +1,62 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from langchain.vectorstores import Qdrant
-import streamlit as st
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
 from dotenv import load_dotenv
-from parsing.chunking import semantic_chunking_with_st
-from services.gemini import summarize_single_row_table
+from parsing.chunking import iter_chunks
 from embedding.embedder import GeminiEmbeddings
-from services.gemini import summarize_image
+from services.clients import get_qdrant_client, load_qdrant, QDRANT_COLLECTION
+from embedding.incremental import IncrementalIndexer, point_id, document_key
+from retrieval.keyword_index import get_keyword_index
+from retrieval.retriever import summary_alias
+from embedding.pipeline_stats import PipelineStats
+from embedding.image_pipeline import load_image_entries, stream_image_documents, IMAGE_SUMMARY_WORKERS, IMAGE_MAX_SIDE
+from embedding.table_pipeline import load_table_rows, stream_table_documents, TABLE_SUMMARY_WORKERS, TABLE_SUMMARY_WINDOW
+from embedding.summary_pipeline import build_summary_index, SUMMARY_WORKERS
 from langchain.schema import Document
 from parsing.docling_images import main
 import json
-import pandas as pd
 from pathlib import Path
 import logging
 
 
 load_dotenv()
 PDF_PATH = "./data/pdf/ifc-annual-report-2024-financials.pdf"
-QDRANT_COLLECTION = "ifc_report"
-
-def load_qdrant():
-    vectorstore = Qdrant(
-        client=QdrantClient(host="localhost", port=6333),
-        collection_name="ifc_report",
-        embeddings=GeminiEmbeddings()
-    )
-    return vectorstore
-
-@st.cache_resource(show_spinner=False)
-def get_qdrant_client():
-    return QdrantClient(host="localhost", port=6333)
 
 
 def build_qdrant_index(chunks, embedding_model, collection_name="my_collection"):
     client = get_qdrant_client()
+    indexer = IncrementalIndexer(client, embedding_model, alias=collection_name, keyword_index=get_keyword_index(collection_name))
 
-    if collection_name in [c.name for c in client.get_collections().collections]:
-        client.delete_collection(collection_name=collection_name)
-
-    vector_size = len(embedding_model.embed_query("sample text"))
+    ids = [point_id("text", document_key(chunk)) for chunk in chunks]
+    indexer.sync("text", ids, dict(zip(ids, chunks)))
 
-    client.recreate_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
-    )
-
-    vectorstore = Qdrant.from_documents(
-        documents=chunks,
-        embedding=embedding_model,
-        collection_name=collection_name,
-        host="localhost",
-        port=6333
-    )
-
-    return vectorstore
+    return load_qdrant(collection_name, embeddings=embedding_model)
 
 
-def add_images_to_index(vectorstore, figures_json_path: str):
+def add_images_to_index(vectorstore, figures_json_path: str, max_workers=IMAGE_SUMMARY_WORKERS, max_side=IMAGE_MAX_SIDE):
     print("Adding images to index from JSON...")
+    entries = load_image_entries(figures_json_path)
 
-    all_chunks = []
-
-    with open(figures_json_path, "r") as f:
-        image_metadata = json.load(f)
-
-    for image_obj in image_metadata:
-        try:
-            image_path = Path(image_obj["image_path"])
-            with image_path.open("rb") as img_file:
-                image_bytes = img_file.read()
-
-            summary = summarize_image(image_bytes, image_obj["title"])
-
-            doc = Document(
-                page_content=summary,
-                metadata={
-                    "title": image_obj.get("title", "Unknown"),
-                    "page": image_obj.get("page_number", -1),
-                    "section": image_obj.get("section_title", "Unknown"),
-                    "type": "image",
-                    "content": image_obj.get("content", "Unknown"),
-                    "image_path": str(image_path),
-                }
-            )
-            all_chunks.append(doc)
-
-        except Exception as e:
-            print(f"Error on image: {image_obj.get('image_path')}: {e}")
+    indexer = IncrementalIndexer(
+        vectorstore.client, vectorstore.embeddings, alias=vectorstore.collection_name,
+        keyword_index=get_keyword_index(vectorstore.collection_name),
+    )
+    indexed = indexer.indexed_ids()
+    pending = [entry for entry in entries if entry["pid"] not in indexed]
 
-    vectorstore.add_documents(all_chunks)
-    print(f"Added {len(all_chunks)} image summaries to the index.")
+    pipeline_stats = PipelineStats(len(pending), name="Image summarization")
+    documents = stream_image_documents(pending, max_workers=max_workers, max_side=max_side, stats=pipeline_stats)
+    stats = indexer.sync("images", [entry["pid"] for entry in entries], documents)
+    print(f"Image summaries: {stats}")
+    print(f"Image summarization: {pipeline_stats.as_dict()}")
+    return pipeline_stats
 
 
 def load_and_index_documents():
-    print("Extracting text from PDF...")
-    docs = main()
-    print(f"Extracted {len(docs)} text documents.")
+    print("Extracting text from PDF and chunking documents...")
     embedding_model = GeminiEmbeddings()
 
-    all_chunks = []
-    print("Chunking documents...")
-    for doc in docs:
-        chunks = semantic_chunking_with_st(doc.page_content)
-        for chunk in chunks:
-            chunk.metadata = doc.metadata
-            all_chunks.append(chunk)
+    all_chunks = list(iter_chunks(main(stream=True)))
     print(f"Created {len(all_chunks)} chunks from text documents.")
 
     vectorstore = build_qdrant_index(
@@ -115,70 +64,42 @@ def load_and_index_documents():
         embedding_model,
         collection_name=QDRANT_COLLECTION
     )
+    if embedding_model.cache is not None:
+        embedding_model.cache.log_stats()
     return vectorstore
 
-def chunk_tables_from_csv_and_metadata(vectorstore, csv_dir, metadata_path):
+def chunk_tables_from_csv_and_metadata(vectorstore, csv_dir, metadata_path, max_workers=TABLE_SUMMARY_WORKERS, window_size=TABLE_SUMMARY_WINDOW, window_sizes=None):
     print("Loading tables")
-    with open(metadata_path, "r") as f:
-        table_metadata = json.load(f)
-
-    all_documents = []
-
-    for meta in table_metadata:
-        csv_file = Path(csv_dir) / meta["csv"]
-        if not csv_file.exists():
-            print(f"Warning: {csv_file} not found.")
-            continue
-        print("Reading df")
-        try:
-            df = pd.read_csv(csv_file)
-        except Exception as e:
-            print(f"Error loading {csv_file}: {e}")
-            continue
-
-        title = meta.get("title", "Unknown")
-        page = meta.get("page_number", -1)
-        section = meta.get("section", "Unknown")
-        content_title = meta.get("content", "Unknown")
-
-        headers = list(df.columns)
-        for idx, row in df.iterrows():
-            row_values = [str(row[col]) for col in headers]
-            summary = summarize_single_row_table(title, headers, row_values)
-
-            # Markdown table
-            header_line = " | ".join(headers)
-            separator_line = " | ".join(["---"] * len(headers))
-            row_line = " | ".join(row_values)
-            markdown_table = f"{header_line}\n{separator_line}\n{row_line}"
-
-            content = f"""Title: {title}  
-                    Summary: {summary}
-
-                    Table:
-                    {markdown_table}
-                     """
-
-            doc = Document(
-                page_content=content,
-                metadata={
-                    "page": page,
-                    "section": section,
-                    "type": "table",
-                    "row_index": idx,
-                    "title": title,
-                    "content": content_title,
-                }
-            )
-            print("adding document")
-            all_documents.append(doc)
-
-
-    vectorstore.add_documents(all_documents)
-    print(f"Added {len(all_documents)} tables to the index.")
+    rows = load_table_rows(csv_dir, metadata_path)
+
+    indexer = IncrementalIndexer(
+        vectorstore.client, vectorstore.embeddings, alias=vectorstore.collection_name,
+        keyword_index=get_keyword_index(vectorstore.collection_name),
+    )
+    indexed = indexer.indexed_ids()
+    pending = [row for row in rows if row["pid"] not in indexed]
+    print(f"Loaded {len(rows)} table rows, {len(pending)} not yet indexed.")
 
+    pipeline_stats = PipelineStats(len(pending), name="Table summarization")
+    documents = stream_table_documents(
+        pending, max_workers=max_workers, window_size=window_size, window_sizes=window_sizes, stats=pipeline_stats
+    )
+    stats = indexer.sync("tables", [row["pid"] for row in rows], documents)
+    print(f"Table rows: {stats}")
+    print(f"Table summarization: {pipeline_stats.as_dict()}")
+    return pipeline_stats
+
+
+def add_summaries_to_index(vectorstore, max_workers=SUMMARY_WORKERS):
+    # Run after text, images and tables are indexed: summaries are built from what the collection holds.
+    print("Summarizing pages and sections")
+    return build_summary_index(
+        vectorstore.client, vectorstore.embeddings,
+        source_alias=vectorstore.collection_name, alias=summary_alias(vectorstore.collection_name), max_workers=max_workers,
+    )
 
 
 #load_and_index_documents()
 #add_images_to_index(load_qdrant(), "./scratch/ifc-annual-report-2024-financials-figures.json")
 #chunk_tables_from_csv_and_metadata(load_qdrant(), "./", "./scratch/ifc-annual-report-2024-financials-tables.json")
+#add_summaries_to_index(load_qdrant())
@@ -0,0 +1,50 @@
+import logging
+import threading
+import time
+
+PROGRESS_EVERY = 100
+
+
+class PipelineStats:
+    def __init__(self, total: int = 0, name: str = "Pipeline"):
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.cache_hits = 0
+        self.llm_calls = 0
+        self.failed = 0
+        self.timings = {}
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, cached: bool = False, llm_calls: int = 0, failed: bool = False):
+        with self._lock:
+            self.done += 1
+            self.cache_hits += int(cached)
+            self.llm_calls += llm_calls
+            self.failed += int(failed)
+            if self.done % PROGRESS_EVERY == 0 or self.done == self.total:
+                self.log()
+
+    def add_timing(self, stage: str, seconds: float):
+        with self._lock:
+            self.timings.setdefault(stage, []).append(seconds)
+
+    def as_dict(self) -> dict:
+        elapsed = time.monotonic() - self.start
+        stats = {
+            "done": self.done,
+            "total": self.total,
+            "cache_hits": self.cache_hits,
+            "llm_calls": self.llm_calls,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 2),
+            "items_per_s": round(self.done / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+        for stage, values in self.timings.items():
+            stats[f"{stage}_mean_ms"] = round(1000 * sum(values) / len(values), 1)
+            stats[f"{stage}_total_s"] = round(sum(values), 2)
+        return stats
+
+    def log(self):
+        logging.info(f"{self.name} progress: {self.as_dict()}")
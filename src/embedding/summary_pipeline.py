@@ -0,0 +1,136 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langchain.schema import Document
+
+from embedding.incremental import IncrementalIndexer, UPSERT_BATCH_SIZE, point_id
+from embedding.pipeline_stats import PipelineStats
+from services.gemini import summarize_passage
+from services.rate_limit import TokenBucket, call_with_retry
+from services.summary_cache import SummaryCache, make_key
+
+SUMMARY_WORKERS = 4
+SUMMARY_RPS = 2.0
+# Characters of page or section content sent to the model per summary.
+SUMMARY_MAX_CHARS = 12_000
+UNKNOWN_SECTIONS = {None, "", "Unknown"}
+
+
+def load_payloads(client, collection_name: str) -> list[dict]:
+    payloads = []
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name, limit=UPSERT_BATCH_SIZE, offset=offset, with_payload=True, with_vectors=False
+        )
+        payloads.extend(record.payload for record in records)
+        if offset is None:
+            break
+    return payloads
+
+
+def _valid_page(page) -> bool:
+    return isinstance(page, int) and page >= 0
+
+
+def group_passages(payloads: list[dict]) -> list[dict]:
+    pages = {}
+    sections = {}
+    for payload in payloads:
+        metadata = payload.get("metadata") or {}
+        text = payload.get("page_content", "")
+        page = metadata.get("page")
+        if _valid_page(page):
+            pages.setdefault(page, []).append(text)
+        section = metadata.get("section")
+        if section not in UNKNOWN_SECTIONS:
+            entry = sections.setdefault(section, {"texts": [], "pages": set()})
+            entry["texts"].append(text)
+            if _valid_page(page):
+                entry["pages"].add(page)
+
+    groups = []
+    for page, texts in sorted(pages.items()):
+        groups.append({
+            "level": "page",
+            "label": f"page {page}",
+            "texts": texts,
+            "metadata": {"level": "page", "page": page, "pages": [page], "type": "summary"},
+        })
+    for section, entry in sections.items():
+        section_pages = sorted(entry["pages"])
+        if not section_pages:
+            continue
+        groups.append({
+            "level": "section",
+            "label": section,
+            "texts": entry["texts"],
+            "metadata": {"level": "section", "section": section, "page": section_pages[0], "pages": section_pages, "type": "summary"},
+        })
+
+    for group in groups:
+        group["text"] = "\n\n".join(group.pop("texts"))[:SUMMARY_MAX_CHARS]
+        group["pid"] = point_id("summaries", make_key(group["level"], group["label"], group["text"]))
+    return groups
+
+
+def summary_document(group: dict, summary: str) -> Document:
+    pages = group["metadata"]["pages"]
+    page_label = f"{pages[0]}" if len(pages) == 1 else f"{pages[0]}-{pages[-1]}"
+    content = f"{group['level'].title()}: {group['label']}\nPages: {page_label}\nSummary: {summary}"
+    return Document(page_content=content, metadata=group["metadata"])
+
+
+def stream_summary_documents(
+    groups: list[dict],
+    max_workers: int = SUMMARY_WORKERS,
+    requests_per_second: float = SUMMARY_RPS,
+    cache: SummaryCache = None,
+    stats: PipelineStats = None,
+):
+    cache = cache or SummaryCache("passages")
+    stats = stats or PipelineStats(len(groups), name="Page/section summarization")
+    bucket = TokenBucket(requests_per_second)
+
+    pending = []
+    for group in groups:
+        group["cache_key"] = make_key(group["level"], group["label"], group["text"])
+        summary = cache.get(group["cache_key"])
+        if summary is not None:
+            stats.record(cached=True)
+            yield group["pid"], summary_document(group, summary)
+        else:
+            pending.append(group)
+
+    def summarize(group):
+        summary = call_with_retry(summarize_passage, group["level"], group["label"], group["text"], bucket=bucket)
+        cache.put(group["cache_key"], summary)
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(summarize, group): group for group in pending}
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                logging.error(f"Error summarizing {group['level']} '{group['label']}': {e}")
+                stats.record(llm_calls=1, failed=True)
+                continue
+            stats.record(llm_calls=1)
+            yield group["pid"], summary_document(group, summary)
+
+
+def build_summary_index(client, embedding_model, source_alias: str, alias: str, max_workers: int = SUMMARY_WORKERS) -> PipelineStats:
+    groups = group_passages(load_payloads(client, source_alias))
+    indexer = IncrementalIndexer(client, embedding_model, alias=alias)
+    indexed = indexer.indexed_ids()
+    pending = [group for group in groups if group["pid"] not in indexed]
+    print(f"{len(groups)} page/section groups, {len(pending)} not yet summarized.")
+
+    pipeline_stats = PipelineStats(len(pending), name="Page/section summarization")
+    documents = stream_summary_documents(pending, max_workers=max_workers, stats=pipeline_stats)
+    stats = indexer.sync("summaries", [group["pid"] for group in groups], documents)
+    print(f"Summaries: {stats}")
+    print(f"Page/section summarization: {pipeline_stats.as_dict()}")
+    return pipeline_stats
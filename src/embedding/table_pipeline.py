@@ -0,0 +1,134 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+from langchain.schema import Document
+
+from embedding.incremental import point_id
+from embedding.pipeline_stats import PipelineStats
+from services.gemini import summarize_single_row_table, summarize_table_rows
+from services.rate_limit import TokenBucket, call_with_retry
+from services.summary_cache import SummaryCache, make_key
+
+TABLE_SUMMARY_WORKERS = 8
+TABLE_SUMMARY_RPS = 5.0
+# Rows per summarization request; 1 means one call per row.
+TABLE_SUMMARY_WINDOW = 25
+
+
+def load_table_rows(csv_dir, metadata_path) -> list[dict]:
+    with open(metadata_path, "r") as f:
+        table_metadata = json.load(f)
+
+    rows = []
+    for meta in table_metadata:
+        csv_file = Path(csv_dir) / meta["csv"]
+        if not csv_file.exists():
+            print(f"Warning: {csv_file} not found.")
+            continue
+        try:
+            df = pd.read_csv(csv_file)
+        except Exception as e:
+            print(f"Error loading {csv_file}: {e}")
+            continue
+
+        headers = [str(h) for h in df.columns]
+        values = df.astype(str)
+        header_line = " | ".join(headers)
+        separator_line = " | ".join(["---"] * len(headers))
+        row_lines = values.agg(" | ".join, axis=1) if len(headers) else pd.Series("", index=df.index)
+
+        for idx, row_values, row_line in zip(df.index, values.values.tolist(), row_lines):
+            rows.append({
+                "table": meta["csv"],
+                "pid": point_id("tables", json.dumps([meta, headers, row_values, idx], default=str)),
+                "title": meta.get("title", "Unknown"),
+                "headers": headers,
+                "row_values": row_values,
+                "markdown_table": f"{header_line}\n{separator_line}\n{row_line}",
+                "metadata": {
+                    "page": meta.get("page_number", -1),
+                    "section": meta.get("section", meta.get("section_title", "Unknown")),
+                    "type": "table",
+                    "row_index": int(idx),
+                    "title": meta.get("title", "Unknown"),
+                    "content": meta.get("content", "Unknown"),
+                },
+            })
+    return rows
+
+
+def row_document(row: dict, summary: str) -> Document:
+    content = f"Title: {row['title']}\nSummary: {summary}\n\nTable:\n{row['markdown_table']}"
+    return Document(page_content=content, metadata=row["metadata"])
+
+
+def make_windows(rows: list[dict], window_size: int, window_sizes: dict = None) -> list[list[dict]]:
+    window_sizes = window_sizes or {}
+    by_table = {}
+    for row in rows:
+        by_table.setdefault(row["table"], []).append(row)
+    windows = []
+    for table, table_rows in by_table.items():
+        size = max(1, window_sizes.get(table, window_size))
+        windows.extend(table_rows[i:i+size] for i in range(0, len(table_rows), size))
+    return windows
+
+
+def stream_table_documents(
+    rows: list[dict],
+    max_workers: int = TABLE_SUMMARY_WORKERS,
+    requests_per_second: float = TABLE_SUMMARY_RPS,
+    window_size: int = TABLE_SUMMARY_WINDOW,
+    window_sizes: dict = None,
+    cache: SummaryCache = None,
+    stats: PipelineStats = None,
+):
+    cache = cache or SummaryCache("table_rows")
+    stats = stats or PipelineStats(len(rows), name="Table summarization")
+    bucket = TokenBucket(requests_per_second)
+
+    pending = []
+    for row in rows:
+        row["cache_key"] = make_key(row["title"], row["headers"], row["row_values"])
+        summary = cache.get(row["cache_key"])
+        if summary is not None:
+            stats.record(cached=True)
+            yield row["pid"], row_document(row, summary)
+        else:
+            pending.append(row)
+
+    def summarize_window(window):
+        calls = 0
+        summaries = [None] * len(window)
+        if len(window) > 1:
+            calls += 1
+            try:
+                summaries = call_with_retry(
+                    summarize_table_rows, window[0]["title"], window[0]["headers"], [row["row_values"] for row in window], bucket=bucket
+                )
+            except Exception as e:
+                logging.warning(f"Batch summary failed for '{window[0]['title']}', falling back to per-row calls: {e}")
+        results = []
+        for row, summary in zip(window, summaries):
+            if summary is None:
+                try:
+                    summary = call_with_retry(summarize_single_row_table, row["title"], row["headers"], row["row_values"], bucket=bucket)
+                except Exception as e:
+                    logging.error(f"Failed to summarize row {row['metadata']['row_index']} of '{row['title']}': {e}")
+                calls += 1
+            if summary is not None:
+                cache.put(row["cache_key"], summary)
+            results.append((row, summary))
+        return results, calls
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(summarize_window, window) for window in make_windows(pending, window_size, window_sizes)]
+        for future in as_completed(futures):
+            results, calls = future.result()
+            for i, (row, summary) in enumerate(results):
+                stats.record(llm_calls=calls if i == 0 else 0, failed=summary is None)
+                if summary is not None:
+                    yield row["pid"], row_document(row, summary)
@@ -0,0 +1,94 @@
+import os
+from functools import lru_cache
+
+from qdrant_client.models import (
+    CompressionRatio,
+    Datatype,
+    Distance,
+    HnswConfigDiff,
+    OptimizersConfigDiff,
+    ProductQuantization,
+    ProductQuantizationConfig,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
+
+VECTOR_PROFILE = os.getenv("VECTOR_PROFILE", "float32")
+# Qdrant keeps segments under 20 MB as plain full scans by default, which would leave a
+# single report's collection without HNSW or quantization; index from 1 MB instead.
+INDEXING_THRESHOLD_KB = 1000
+
+# datatype/on_disk describe the original vectors; quantized copies always stay in RAM.
+VECTOR_PROFILES = {
+    "float32": {"datatype": "float32", "on_disk": False, "quantization": None, "m": 16, "ef_construct": 100, "ef": 128},
+    "int8": {
+        "datatype": "float32", "on_disk": True, "quantization": "int8", "oversampling": 2.0,
+        "m": 16, "ef_construct": 100, "ef": 128,
+    },
+    "float16_int8": {
+        "datatype": "float16", "on_disk": True, "quantization": "int8", "oversampling": 2.0,
+        "m": 16, "ef_construct": 100, "ef": 128,
+    },
+    "pq": {
+        "datatype": "float16", "on_disk": True, "quantization": "pq", "compression": "x16", "oversampling": 4.0,
+        "m": 16, "ef_construct": 200, "ef": 256,
+    },
+}
+
+PQ_COMPRESSION = {"x4": 4, "x8": 8, "x16": 16, "x32": 32, "x64": 64}
+DATATYPE_BYTES = {"float32": 4, "float16": 2}
+
+
+def get_profile(name: str = VECTOR_PROFILE) -> dict:
+    if name not in VECTOR_PROFILES:
+        raise ValueError(f"Unknown vector profile '{name}', expected one of {list(VECTOR_PROFILES)}")
+    return dict(VECTOR_PROFILES[name], name=name)
+
+
+def collection_params(profile: dict, size: int) -> dict:
+    params = {
+        "vectors_config": VectorParams(
+            size=size,
+            distance=Distance.COSINE,
+            on_disk=profile["on_disk"],
+            datatype=Datatype.FLOAT16 if profile["datatype"] == "float16" else Datatype.FLOAT32,
+        ),
+        "hnsw_config": HnswConfigDiff(m=profile["m"], ef_construct=profile["ef_construct"]),
+        "optimizers_config": OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD_KB),
+    }
+    if profile["quantization"] == "int8":
+        params["quantization_config"] = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    elif profile["quantization"] == "pq":
+        params["quantization_config"] = ProductQuantization(
+            product=ProductQuantizationConfig(compression=CompressionRatio(profile["compression"]), always_ram=True)
+        )
+    return params
+
+
+@lru_cache(maxsize=None)
+def search_params(name: str = VECTOR_PROFILE, ef: int = None, exact: bool = False) -> SearchParams:
+    profile = get_profile(name)
+    quantization = None
+    if profile["quantization"] is not None:
+        quantization = QuantizationSearchParams(ignore=exact, rescore=True, oversampling=profile["oversampling"])
+    return SearchParams(hnsw_ef=ef or profile["ef"], exact=exact, quantization=quantization)
+
+
+def memory_footprint(profile: dict, count: int, size: int) -> dict:
+    originals = count * size * DATATYPE_BYTES[profile["datatype"]]
+    if profile["quantization"] == "int8":
+        quantized = count * size
+    elif profile["quantization"] == "pq":
+        quantized = count * size * 4 // PQ_COMPRESSION[profile["compression"]]
+    else:
+        quantized = 0
+    # Each HNSW node keeps up to 2*m links on layer 0 as 4-byte ids.
+    graph = count * profile["m"] * 2 * 4
+    ram = quantized + graph + (0 if profile["on_disk"] else originals)
+    return {"ram_bytes": ram, "disk_bytes": originals, "quantized_bytes": quantized, "graph_bytes": graph}
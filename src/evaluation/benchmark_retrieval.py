@@ -0,0 +1,348 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.models import CollectionStatus, Distance, VectorParams
+
+from embedding.incremental import UPSERT_BATCH_SIZE
+from embedding.vector_profiles import VECTOR_PROFILES, collection_params, get_profile, memory_footprint, search_params
+from evaluation.labels import expected_pages, is_hit, is_type_hit
+from retrieval.intent import parse_intent
+from retrieval.rerank import cascade_rerank
+from retrieval.keyword_index import get_keyword_index
+from retrieval.retriever import FINE_K, HYBRID_K, coarse_to_fine_search, hybrid_search_by_vector, search_by_vector, summary_alias
+from services import clients
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DATASET_PATH = "./data/RAG_evaluation_dataset.csv"
+SNAPSHOT_DIR = "./scratch"
+BASELINE_PATH = "./data/retrieval_baseline.json"
+TOP_K = 10
+CANDIDATES = 50
+RECALL_AT = (1, 5, 10)
+# Allowed drop in any quality metric before a run is flagged as a regression.
+REGRESSION_TOLERANCE = 0.01
+# Half-width of the simulated "pages N-M" filter around the ground-truth page.
+PAGE_WINDOW = 2
+
+# filter: None, "intent" (regex intent parser), "page_window" (narrow range around the answer page)
+# or "summaries" (pages picked by the page/section summary index, falling back to no filter).
+# strategy: "auto" picks exact scoring for selective filters, "hnsw"/"exact" force one path.
+CONFIGS = {
+    "dense": {"mode": "dense", "k": TOP_K, "filter": None, "rerank": False},
+    "dense_filter": {"mode": "dense", "k": TOP_K, "filter": "intent", "rerank": False},
+    "rerank": {"mode": "dense", "k": CANDIDATES, "filter": None, "rerank": True},
+    "filter_rerank": {"mode": "dense", "k": CANDIDATES, "filter": "intent", "rerank": True},
+    "hybrid": {"mode": "hybrid", "k": TOP_K, "filter": None, "rerank": False},
+    "hybrid_rerank": {"mode": "hybrid", "k": HYBRID_K, "filter": None, "rerank": True},
+    "hybrid_filter_rerank": {"mode": "hybrid", "k": HYBRID_K, "filter": "intent", "rerank": True},
+    "page_window_hnsw": {"mode": "dense", "k": TOP_K, "filter": "page_window", "strategy": "hnsw", "rerank": False},
+    "page_window_auto": {"mode": "dense", "k": TOP_K, "filter": "page_window", "strategy": "auto", "rerank": False},
+    "coarse_to_fine": {"mode": "hybrid", "k": FINE_K, "filter": "summaries", "rerank": False},
+    "coarse_to_fine_rerank": {"mode": "hybrid", "k": FINE_K, "filter": "summaries", "rerank": True},
+}
+
+
+def first_hit_rank(docs, row):
+    for rank, doc in enumerate(docs, start=1):
+        if is_hit(doc, row):
+            return rank
+    return None
+
+
+def sample_metrics(docs, row) -> dict:
+    rank = first_hit_rank(docs, row)
+    metrics = {f"recall@{k}": float(rank is not None and rank <= k) for k in RECALL_AT}
+    metrics["mrr"] = 1.0 / rank if rank is not None else 0.0
+    top = docs[:TOP_K]
+    metrics["page_hit_rate"] = sum(is_hit(doc, row) for doc in top) / len(top) if top else 0.0
+    metrics["type_recall"] = float(any(is_type_hit(doc, row) for doc in top))
+    return metrics
+
+
+def snapshot_paths(collection_name: str, snapshot_dir: str = SNAPSHOT_DIR):
+    base = Path(snapshot_dir) / f"{collection_name}-snapshot"
+    return base.with_suffix(".npz"), base.with_suffix(".jsonl")
+
+
+def read_points(client, collection_name: str) -> tuple[list[str], np.ndarray, list[dict]]:
+    ids, vectors, payloads = [], [], []
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name, limit=UPSERT_BATCH_SIZE, offset=offset, with_payload=True, with_vectors=True
+        )
+        for record in records:
+            ids.append(str(record.id))
+            vectors.append(record.vector)
+            payloads.append(record.payload)
+        if offset is None:
+            break
+    return ids, np.asarray(vectors, dtype=np.float32), payloads
+
+
+def export_snapshot(client, collection_name: str = clients.QDRANT_COLLECTION, snapshot_dir: str = SNAPSHOT_DIR):
+    aliases = {alias.alias_name for alias in client.get_aliases().aliases}
+    for name in (collection_name, summary_alias(collection_name)):
+        if name != collection_name and name not in aliases:
+            continue
+        ids, vectors, payloads = read_points(client, name)
+        vectors_path, payloads_path = snapshot_paths(name, snapshot_dir)
+        vectors_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(vectors_path, ids=np.array(ids), vectors=vectors)
+        with open(payloads_path, "w") as f:
+            for payload in payloads:
+                f.write(json.dumps(payload, default=str) + "\n")
+        logging.info(f"Exported {len(ids)} points from '{name}' to {vectors_path}")
+
+
+def _load_snapshot_collection(client, collection_name: str, snapshot_dir: str) -> int:
+    vectors_path, payloads_path = snapshot_paths(collection_name, snapshot_dir)
+    data = np.load(vectors_path)
+    with open(payloads_path) as f:
+        payloads = [json.loads(line) for line in f]
+
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=data["vectors"].shape[1], distance=Distance.COSINE),
+    )
+    client.upload_collection(
+        collection_name=collection_name,
+        vectors=data["vectors"],
+        payload=payloads,
+        ids=[str(pid) for pid in data["ids"]],
+        batch_size=UPSERT_BATCH_SIZE,
+        wait=True,
+    )
+    logging.info(f"Loaded {len(payloads)} points into an in-memory index from {vectors_path}")
+    return len(payloads)
+
+
+def load_snapshot(collection_name: str = clients.QDRANT_COLLECTION, snapshot_dir: str = SNAPSHOT_DIR) -> QdrantClient:
+    client = QdrantClient(location=":memory:")
+    _load_snapshot_collection(client, collection_name, snapshot_dir)
+    get_keyword_index(collection_name).rebuild(client, collection_name)
+    # Summaries are optional; without them the coarse_to_fine config falls back to flat search.
+    if snapshot_paths(summary_alias(collection_name), snapshot_dir)[0].exists():
+        _load_snapshot_collection(client, summary_alias(collection_name), snapshot_dir)
+    return client
+
+
+def _search(client, collection_name, row, vector, config: dict, filters: tuple, pages: tuple = None) -> list:
+    if config["filter"] == "summaries":
+        results = coarse_to_fine_search(client, collection_name, vector, row["Question"], k=config["k"], mode=config["mode"])
+        if results is not None:
+            return results
+    strategy = config.get("strategy", "auto")
+    if config["mode"] == "hybrid":
+        return hybrid_search_by_vector(client, collection_name, vector, row["Question"], *filters, k=config["k"], strategy=strategy, pages=pages)
+    return search_by_vector(client, collection_name, vector, *filters, k=config["k"], strategy=strategy, pages=pages)
+
+
+def page_window(row) -> tuple:
+    """Returns (page_start, page_end, pages): a range around a single answer page, or the union of
+    the windows around each page when the answer spans several."""
+    answer_pages = sorted(expected_pages(row))
+    if len(answer_pages) == 1:
+        return max(1, answer_pages[0] - PAGE_WINDOW), answer_pages[0] + PAGE_WINDOW, None
+    pages = {p for page in answer_pages for p in range(max(1, page - PAGE_WINDOW), page + PAGE_WINDOW + 1)}
+    return None, None, tuple(sorted(pages))
+
+
+def run_config(client, collection_name, row, vector, config: dict) -> tuple[list, dict]:
+    timings = {}
+    filters = (None, None, None)
+    pages = None
+    if config["filter"] == "intent":
+        start = time.perf_counter()
+        intent = parse_intent(row["Question"])
+        if intent is not None:
+            filters = intent[1:]
+        timings["intent"] = time.perf_counter() - start
+    elif config["filter"] == "page_window":
+        page_start, page_end, pages = page_window(row)
+        filters = (page_start, page_end, None)
+
+    start = time.perf_counter()
+    results = _search(client, collection_name, row, vector, config, filters, pages)
+    timings["search"] = time.perf_counter() - start
+
+    if config["rerank"]:
+        start = time.perf_counter()
+        docs = cascade_rerank(row["Question"], results, top_k=TOP_K)
+        timings["rerank"] = time.perf_counter() - start
+    else:
+        docs = [doc for doc, _ in results][:TOP_K]
+    return docs, timings, pages is not None or any(f is not None for f in filters)
+
+
+def aggregate(samples: list[dict], split_filtered: bool = True) -> dict:
+    summary = {"samples": len(samples), "quality": {}, "latency": {}}
+    if not samples:
+        return summary
+    for name in samples[0]["metrics"]:
+        summary["quality"][name] = float(np.mean([s["metrics"][name] for s in samples]))
+    stages = {}
+    for s in samples:
+        for stage, seconds in s["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+    for stage, values in stages.items():
+        p50, p95 = np.percentile(values, [50, 95])
+        summary["latency"][stage] = {"p50_ms": round(1000 * p50, 2), "p95_ms": round(1000 * p95, 2)}
+    filtered = [s for s in samples if s["filtered"]]
+    if split_filtered and filtered and len(filtered) < len(samples):
+        # Filtered searches take a different path (payload index, exact scoring), so report them on their own.
+        summary["filtered"] = aggregate(filtered, split_filtered=False)
+        summary["unfiltered"] = aggregate([s for s in samples if not s["filtered"]], split_filtered=False)
+    return summary
+
+
+def _wait_for_indexing(client, collection_name: str, timeout: float = 300.0):
+    if not hasattr(client, "get_collection"):
+        return
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection_name).status != CollectionStatus.GREEN and time.monotonic() < deadline:
+        time.sleep(0.5)
+
+
+def benchmark_profiles(client, collection_name: str, query_vectors: np.ndarray, profiles: list[str], k: int = TOP_K) -> dict:
+    ids, vectors, payloads = read_points(client, collection_name)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+    # Ground truth is exact float32 cosine search over the live vectors.
+    truth = np.argsort(-(query_vectors @ normalized.T), axis=1)[:, :k]
+    truth_ids = [{ids[i] for i in row} for row in truth]
+
+    report = {}
+    for name in profiles:
+        profile = get_profile(name)
+        bench_collection = f"{collection_name}_bench_{name}"
+        if client.collection_exists(bench_collection):
+            client.delete_collection(bench_collection)
+        client.create_collection(collection_name=bench_collection, **collection_params(profile, vectors.shape[1]))
+        client.upload_collection(
+            collection_name=bench_collection, vectors=vectors, payload=payloads, ids=ids, batch_size=UPSERT_BATCH_SIZE, wait=True
+        )
+        if hasattr(client, "flush"):
+            client.flush()
+        _wait_for_indexing(client, bench_collection)
+
+        recalls, latencies = [], []
+        for vector, expected in zip(query_vectors, truth_ids):
+            start = time.perf_counter()
+            points = client.search(
+                collection_name=bench_collection, query_vector=vector, search_params=search_params(name), limit=k, with_payload=False
+            )
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len({str(p.id) for p in points} & expected) / k)
+        client.delete_collection(bench_collection)
+
+        p50, p95 = np.percentile(latencies, [50, 95])
+        report[name] = {
+            f"recall@{k}_vs_float32": float(np.mean(recalls)),
+            "latency": {"search": {"p50_ms": round(1000 * p50, 2), "p95_ms": round(1000 * p95, 2)}},
+            # Computed from the profile settings, not measured on the server.
+            "memory_estimate": memory_footprint(profile, len(ids), vectors.shape[1]),
+        }
+        memory_mb = report[name]["memory_estimate"]["ram_bytes"] / 2**20
+        print(f"{name}: recall@{k}={report[name][f'recall@{k}_vs_float32']:.3f} ram~{memory_mb:.1f}MB (estimated) p95={p95 * 1000:.2f}ms")
+    return report
+
+
+def compare(report: dict, baseline: dict) -> list[str]:
+    regressions = []
+    for name, summary in report.items():
+        if name not in baseline:
+            continue
+        print(f"\n{name} vs baseline:")
+        for metric, value in summary["quality"].items():
+            before = baseline[name]["quality"].get(metric)
+            if before is None:
+                continue
+            print(f"  {metric:<14} {value:.3f} ({value - before:+.3f})")
+            if value < before - REGRESSION_TOLERANCE:
+                regressions.append(f"{name}: {metric} {before:.3f} -> {value:.3f}")
+        for stage, latency in summary["latency"].items():
+            before = baseline[name]["latency"].get(stage)
+            if before is not None:
+                print(f"  {stage + ' p95':<14} {latency['p95_ms']:.2f}ms ({latency['p95_ms'] - before['p95_ms']:+.2f}ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval-only benchmark against the evaluation dataset (no LLM judge).")
+    parser.add_argument("--source", choices=["live", "snapshot"], default="live",
+                        help="query the configured Qdrant, or an in-memory index loaded from the scratch/ snapshot")
+    parser.add_argument("--export-snapshot", action="store_true", help="dump the live collection to scratch/ and exit")
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--profiles", nargs="*", choices=list(VECTOR_PROFILES),
+                        help="benchmark vector storage profiles (memory, recall vs float32, latency) instead of pipeline configs")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--output", default="./data/evaluation/retrieval_benchmark.json")
+    args = parser.parse_args()
+
+    embedded = args.source == "snapshot" or (clients.VECTOR_BACKEND == "qdrant" and clients.QDRANT_LOCATION)
+    if args.profiles is not None and embedded:
+        # Embedded Qdrant ignores HNSW and quantization settings and always searches brute force,
+        # so every profile would report perfect recall and meaningless latencies.
+        parser.error("--profiles needs a Qdrant server; embedded Qdrant (--source snapshot or QDRANT_LOCATION) ignores profile settings")
+
+    collection_name = clients.QDRANT_COLLECTION
+    if args.export_snapshot:
+        export_snapshot(clients.get_qdrant_client(), collection_name)
+        return
+    client = load_snapshot(collection_name) if args.source == "snapshot" else clients.get_qdrant_client()
+
+    df = pd.read_csv(DATASET_PATH)
+    embeddings = clients.get_embeddings()
+    # Query embeddings go through the embedding cache, so repeat runs make no API calls.
+    start = time.perf_counter()
+    vectors = [embeddings.embed_query(question) for question in df["Question"]]
+    embed_ms = 1000 * (time.perf_counter() - start) / max(1, len(df))
+
+    if args.profiles is not None:
+        report = benchmark_profiles(client, collection_name, np.asarray(vectors, dtype=np.float32), args.profiles or list(VECTOR_PROFILES))
+        output = Path(args.output).with_name("vector_profiles.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        return
+
+    report = {}
+    for name in args.configs:
+        samples = []
+        for (_, row), vector in zip(df.iterrows(), vectors):
+            docs, timings, filtered = run_config(client, collection_name, row, vector, CONFIGS[name])
+            samples.append({"metrics": sample_metrics(docs, row), "timings": timings, "filtered": filtered})
+        report[name] = aggregate(samples)
+        quality = " ".join(f"{k}={v:.3f}" for k, v in report[name]["quality"].items())
+        print(f"{name}: {quality}")
+    print(f"Query embedding: {embed_ms:.2f}ms/query (amortized)")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(report, indent=2))
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if Path(args.baseline).exists():
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()))
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,87 +2,232 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 
-from qdrant_client import QdrantClient
-from langchain.vectorstores import Qdrant
-
 from ragas import SingleTurnSample
 from ragas.metrics import Faithfulness, LLMContextPrecisionWithReference, ResponseRelevancy
 from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.schema import Document
 
-from embedding.embedder import GeminiEmbeddings, VertexAIChat
-from retrieval.retriever import retrieve
-from services.gemini import call_gemini
+from embedding.embedder import VertexAIChat
+from embedding.incremental import collection_version
+from embedding.vector_profiles import VECTOR_PROFILE
+from retrieval.rerank import get_reranker, load_cascade_config
+from services import clients
+from services.gemini import call_gemini_async
+from services.pipeline import QueryPipeline
+from services.rate_limit import TokenBucket, acall_with_retry
+from services.summary_cache import SummaryCache, make_key
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DATASET_PATH = "./data/RAG_evaluation_dataset.csv"
+EVAL_OUTPUT_DIR = os.getenv("EVAL_OUTPUT_DIR", "./data/evaluation")
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+EVAL_RPS = float(os.getenv("EVAL_RPS", "5.0"))
+EVAL_LIMIT = int(os.getenv("EVAL_LIMIT", "0"))
+GENERATION_MODEL = "gemini-2.0-flash"
+EVALUATOR_MODEL = "gemini-2.0-flash"
+# Runs before the parallel harness passed temperature=10, outside Gemini's 0-2 range; 0 keeps
+# metric scores repeatable, so they are not comparable with those older runs.
+EVALUATOR_TEMPERATURE = 0
+# RAGAS scores the top_k reranked chunks the answer is generated from. Older runs scored all
+# 50 retrieved chunks while generating from the first 10, so their scores are not comparable either.
+EVAL_CONTEXTS = "reranked_top_k"
+
+
+def retrieval_settings() -> dict:
+    # Everything besides the pipeline's own knobs that changes which chunks come back, so
+    # re-tuning the cascade or switching reranker backends never reuses stale retrievals.
+    reranker = get_reranker()
+    return {
+        "vector_profile": VECTOR_PROFILE,
+        "rerank_model": reranker.model_name,
+        "rerank_backend": reranker.backend,
+        "rerank_max_tokens": reranker.max_tokens,
+        "cascade": dict(sorted(load_cascade_config().items())),
+    }
+
+
+def serialize_chunks(docs) -> list[dict]:
+    return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+
+
+def deserialize_chunks(chunks) -> list[Document]:
+    return [Document(page_content=c["page_content"], metadata=c["metadata"]) for c in chunks]
+
+
+class EvalCache:
+    def __init__(self):
+        self.retrieval = SummaryCache("eval_retrieval")
+        self.answers = SummaryCache("eval_answer")
+        self.metrics = SummaryCache("eval_metric")
+
+    @staticmethod
+    async def cached(cache: SummaryCache, key: str, compute):
+        hit = await asyncio.to_thread(cache.get, key)
+        if hit is not None:
+            return json.loads(hit), True
+        value = await compute()
+        await asyncio.to_thread(cache.put, key, json.dumps(value, default=str))
+        return value, False
+
+
+class Evaluator:
+    def __init__(self, pipeline: QueryPipeline, index_version: str, concurrency: int = EVAL_CONCURRENCY, requests_per_second: float = EVAL_RPS):
+        self.pipeline = pipeline
+        self.index_version = index_version
+        self.cache = EvalCache()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(requests_per_second)
+        self.retrieval_settings = retrieval_settings()
+
+        evaluator_llm = LangchainLLMWrapper(VertexAIChat(model=EVALUATOR_MODEL, temperature=EVALUATOR_TEMPERATURE))
+        evaluator_embeddings = LangchainEmbeddingsWrapper(pipeline.embeddings)
+        self.metrics = {
+            "faithfulness": Faithfulness(llm=evaluator_llm),
+            "context_precision": LLMContextPrecisionWithReference(llm=evaluator_llm),
+            "response_relevance": ResponseRelevancy(llm=evaluator_llm, embeddings=evaluator_embeddings),
+        }
+
+    async def _retrieve(self, question: str) -> dict:
+        timings = {}
+        context = await self.pipeline.context(question, timings)
+        return {"chunks": serialize_chunks(context["chunks"]), "timings": timings}
+
+    async def _generate(self, question: str, chunks: list[Document]) -> dict:
+        start = time.perf_counter()
+        answer = await acall_with_retry(self.pipeline.generate_fn, chunks, question, bucket=self.bucket)
+        return {"answer": answer, "timings": {"generate": time.perf_counter() - start}}
+
+    async def _score(self, name: str, sample: SingleTurnSample) -> dict:
+        start = time.perf_counter()
+        score = await acall_with_retry(self.metrics[name].single_turn_ascore, sample, bucket=self.bucket)
+        return {"score": float(score), "timings": {name: time.perf_counter() - start}}
+
+    async def evaluate_row(self, row) -> dict:
+        question = row["Question"]
+        reference = row["Ground_Truth_Context"]
+        async with self.semaphore:
+            retrieval_key = make_key(
+                self.index_version, question, self.pipeline.retrieval_mode, self.pipeline.k, self.pipeline.top_k, self.pipeline.rerank_enabled,
+                self.pipeline.coarse_to_fine, self.retrieval_settings
+            )
+            retrieval, retrieval_cached = await self.cache.cached(
+                self.cache.retrieval, retrieval_key, lambda: self._retrieve(question)
+            )
+            chunks = deserialize_chunks(retrieval["chunks"])
+            contexts = [doc.page_content for doc in chunks]
+
+            answer_key = make_key(GENERATION_MODEL, question, contexts)
+            generation, answer_cached = await self.cache.cached(
+                self.cache.answers, answer_key, lambda: self._generate(question, chunks)
+            )
+            answer = generation["answer"]
+
+            samples = {
+                "faithfulness": SingleTurnSample(user_input=question, retrieved_contexts=contexts, response=answer),
+                "context_precision": SingleTurnSample(user_input=question, reference=reference, retrieved_contexts=contexts),
+                "response_relevance": SingleTurnSample(user_input=question, retrieved_contexts=contexts, response=answer),
+            }
+            scored = await asyncio.gather(*[
+                self.cache.cached(
+                    self.cache.metrics,
+                    make_key(EVALUATOR_MODEL, EVALUATOR_TEMPERATURE, name, question, reference, contexts, answer),
+                    lambda name=name, sample=sample: self._score(name, sample),
+                )
+                for name, sample in samples.items()
+            ])
+
+        timings = {**retrieval["timings"], **generation["timings"]}
+        result = {
+            "index": int(row.name),
+            "question": question,
+            "page_number": row["Page_Number"],
+            "content_type": row["Context_Content_Type"],
+            "answer": answer,
+            "retrieved_pages": [c["metadata"].get("page") for c in retrieval["chunks"]],
+            "retrieval_cached": retrieval_cached,
+            "answer_cached": answer_cached,
+        }
+        for name, (value, _) in zip(samples, scored):
+            result[name] = value["score"]
+            timings.update(value["timings"])
+        result["timings"] = timings
+        return result
+
+
+def summarize(results: list[dict]) -> dict:
+    summary = {"samples": len(results), "means": {}, "latency": {}}
+    for name in ("faithfulness", "context_precision", "response_relevance"):
+        values = [r[name] for r in results if r[name] is not None and not np.isnan(r[name])]
+        summary["means"][name] = float(np.mean(values)) if values else None
+
+    stages = {}
+    for r in results:
+        for stage, seconds in r["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+    for stage, values in stages.items():
+        p50, p95 = np.percentile(values, [50, 95])
+        summary["latency"][stage] = {"p50_ms": round(1000 * p50, 1), "p95_ms": round(1000 * p95, 1), "count": len(values)}
+    return summary
 
 
-embedding_model = GeminiEmbeddings()
-vectorstore = Qdrant(
-    client=QdrantClient(host="localhost", port=6333),
-    collection_name="ifc_report",
-    embeddings=embedding_model
-)
-
-evaluator_llm = LangchainLLMWrapper(VertexAIChat(model="gemini-2.0-flash", temperature=10))
-
-evaluator_embeddings = LangchainEmbeddingsWrapper(embedding_model)
-
-df = pd.read_csv("./data/RAG_evaluation_dataset.csv")
-df = df.head(10)
-
-async def async_call_gemini(context: str, question: str) -> str:
-    import asyncio
-    loop = asyncio.get_running_loop()
-    response = await loop.run_in_executor(None, call_gemini, context, question)
-    return response
-
 async def main():
-    total_faithfulness = 0
-    total_context_precision = 0
-    total_response_relevance = 0
-
-    for i, row in df.iterrows():
-
-        question = row['Question']
-        reference = row['Ground_Truth_Context']
-
-        retrieved_docs = retrieve(vectorstore, question)
-
-        retrieved_contexts = [doc.page_content for doc in retrieved_docs]
-        context_snippet = "\n\n".join(retrieved_contexts[:10])
-
-        response_text = await async_call_gemini(context_snippet, question)
-
-        sample_f = SingleTurnSample(
-            user_input=question,
-            retrieved_contexts=retrieved_contexts,
-            response=response_text,
+    df = pd.read_csv(DATASET_PATH)
+    if EVAL_LIMIT:
+        df = df.head(EVAL_LIMIT)
+
+    pipeline = QueryPipeline(answer_cache=None, generate_fn=call_gemini_async)
+    index_version = collection_version(clients.get_qdrant_client(), clients.QDRANT_COLLECTION)
+    evaluator = Evaluator(pipeline, index_version)
+
+    results = []
+    failed = 0
+    tasks = [asyncio.create_task(evaluator.evaluate_row(row)) for _, row in df.iterrows()]
+    for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+        try:
+            result = await task
+        except Exception as e:
+            failed += 1
+            logging.error(f"Sample failed: {e}")
+            continue
+        results.append(result)
+        logging.info(
+            f"[{done}/{len(tasks)}] faithfulness={result['faithfulness']:.2f} "
+            f"context_precision={result['context_precision']:.2f} "
+            f"response_relevance={result['response_relevance']:.2f}"
         )
-        sample_c = SingleTurnSample(
-            user_input=question,
-            reference=reference,
-            retrieved_contexts=retrieved_contexts,
-        )
-
-        faithfulness_score = await Faithfulness(llm=evaluator_llm).single_turn_ascore(sample_f)
-        context_precision_score = await LLMContextPrecisionWithReference(llm=evaluator_llm).single_turn_ascore(sample_c)
-        response_relevance_score = await ResponseRelevancy(llm=evaluator_llm, embeddings=evaluator_embeddings).single_turn_ascore(sample_f)
-
-        total_faithfulness += faithfulness_score
-        total_context_precision += context_precision_score
-        total_response_relevance += response_relevance_score
-
-        print(f"Faithfulness: {faithfulness_score:.2f}")
-        print(f"Context Precision: {context_precision_score:.2f}")
-        print(f"Response Relevance: {response_relevance_score:.2f}")
 
-        print(f"Finished sample {i+1}.")
+    results.sort(key=lambda r: r["index"])
+    output_dir = Path(EVAL_OUTPUT_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "samples.jsonl", "w") as f:
+        for result in results:
+            f.write(json.dumps(result, default=str) + "\n")
+
+    summary = {
+        **summarize(results),
+        "failed": failed,
+        "index_version": index_version,
+        "evaluator_temperature": EVALUATOR_TEMPERATURE,
+        "contexts": EVAL_CONTEXTS,
+        "top_k": pipeline.top_k,
+        "retrieval_settings": evaluator.retrieval_settings,
+    }
+    with open(output_dir / "summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
 
 
 if __name__ == "__main__":
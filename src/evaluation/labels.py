@@ -0,0 +1,27 @@
+# Ground-truth labels in RAG_evaluation_dataset.csv: Page_Number is one page or a ';'-separated
+# list ("4; 5; 6"), Context_Content_Type is free text such as "table (multi-page)".
+CONTENT_TYPES = ("text", "table", "image")
+
+
+def expected_pages(row) -> set[int]:
+    return {int(page) for page in str(row["Page_Number"]).split(";") if page.strip()}
+
+
+def expected_types(row) -> set[str]:
+    label = str(row["Context_Content_Type"]).strip().lower()
+    # "combination (table and text)" and friends draw on several content types, so any of them counts.
+    if label.startswith("combination"):
+        return set(CONTENT_TYPES)
+    return {type_ for type_ in CONTENT_TYPES if label.startswith(type_)}
+
+
+def is_hit(doc, row) -> bool:
+    try:
+        page = int(doc.metadata.get("page"))
+    except (TypeError, ValueError):
+        return False
+    return page in expected_pages(row)
+
+
+def is_type_hit(doc, row) -> bool:
+    return is_hit(doc, row) and doc.metadata.get("type") in expected_types(row)
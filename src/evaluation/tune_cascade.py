@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import itertools
+import json
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from evaluation.labels import is_hit
+from services.clients import load_qdrant
+from retrieval.retriever import search
+from retrieval.rerank import cascade_rerank, get_reranker, CASCADE_CONFIG_PATH, DEFAULT_CASCADE
+
+load_dotenv()
+
+TOP_K = 10
+CANDIDATES = 50
+GRID = {
+    "vector_margin": [0.02, 0.04, 0.06, 0.08, 0.1, 0.15, 1.0],
+    "min_prefix": [10, 20, 30],
+    "prefix_step": [10],
+    "min_rerank_score": [-5.0, -2.0, 0.0, 2.0, 5.0],
+}
+
+
+def recall_at_k(ranked, row, k=TOP_K) -> float:
+    return float(any(is_hit(doc, row) for doc in ranked[:k]))
+
+
+def collect(df, vectorstore):
+    reranker = get_reranker()
+    samples = []
+    for _, row in df.iterrows():
+        results = search(vectorstore, row["Question"], k=CANDIDATES)
+        docs = [doc for doc, _ in results]
+        scores = reranker.score(row["Question"], docs) if docs else np.array([])
+        samples.append((row, results, {id(doc): float(s) for doc, s in zip(docs, scores)}))
+    return samples
+
+
+def evaluate(samples, config):
+    recall = 0.0
+    pairs = 0
+    for row, results, ce_scores in samples:
+        scored = []
+
+        def score_fn(query, docs):
+            scored.extend(docs)
+            return np.array([ce_scores[id(doc)] for doc in docs], dtype=np.float32)
+
+        ranked = cascade_rerank(row["Question"], results, top_k=TOP_K, config=config, score_fn=score_fn)
+        recall += recall_at_k(ranked, row)
+        pairs += len(scored)
+    return recall / len(samples), pairs / len(samples)
+
+
+def main():
+    df = pd.read_csv("./data/RAG_evaluation_dataset.csv")
+    vectorstore = load_qdrant()
+    samples = collect(df, vectorstore)
+
+    full_config = dict(DEFAULT_CASCADE, vector_margin=float("inf"), min_prefix=CANDIDATES, min_rerank_score=float("inf"))
+    full_recall, full_pairs = evaluate(samples, full_config)
+    print(f"Full rerank: recall@{TOP_K}={full_recall:.3f}, pairs/query={full_pairs:.1f}")
+
+    best = None
+    for values in itertools.product(*GRID.values()):
+        config = dict(zip(GRID.keys(), values))
+        recall, pairs = evaluate(samples, config)
+        if recall >= full_recall and (best is None or pairs < best[1]):
+            best = (config, pairs, recall)
+
+    if best is None:
+        print("No cascade configuration matched full-rerank recall; keeping defaults.")
+        return
+    config, pairs, recall = best
+    print(f"Chosen: {config} -> recall@{TOP_K}={recall:.3f}, pairs/query={pairs:.1f}")
+    with open(CASCADE_CONFIG_PATH, "w") as f:
+        json.dump(config, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,105 @@
-from langchain_experimental.text_splitter import SemanticChunker
-#from langchain.embeddings import HuggingFaceEmbeddings
+import re
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
 from langchain.schema import Document
-from embedding.embedder import GeminiEmbeddings
+from embedding.embedder import SentenceTransformerEmbeddings
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.?!])\s+")
+BREAKPOINT_PERCENTILE = 95
+MIN_CHUNK_CHARS = 200
+MAX_CHUNK_CHARS = 1500
+CHUNK_BATCH_DOCS = 1000
+
+
+@lru_cache(maxsize=None)
+def get_local_embeddings(model_name: str = "all-MiniLM-L6-v2") -> SentenceTransformerEmbeddings:
+    return SentenceTransformerEmbeddings(model_name)
+
+
+def merge_small_items(docs, min_chars: int = MIN_CHUNK_CHARS, max_chars: int = MAX_CHUNK_CHARS):
+    current = None
+    for doc in docs:
+        if (
+            current is not None
+            and len(current.page_content) < min_chars
+            and current.metadata == doc.metadata
+            and len(current.page_content) + len(doc.page_content) + 1 <= max_chars
+        ):
+            current = Document(page_content=f"{current.page_content}\n{doc.page_content}", metadata=current.metadata)
+            continue
+        if current is not None:
+            yield current
+        current = doc
+    if current is not None:
+        yield current
+
+
+def _split_sentences(text: str, buffer_size: int = 1) -> tuple[list[str], list[str]]:
+    sentences = [s for s in SENTENCE_SPLIT_RE.split(text) if s.strip()]
+    windows = [
+        " ".join(sentences[max(0, i - buffer_size):i + buffer_size + 1])
+        for i in range(len(sentences))
+    ]
+    return sentences, windows
+
+
+def grouped_percentile(values: np.ndarray, groups: np.ndarray, n_groups: int, q: float) -> np.ndarray:
+    """np.percentile (linear interpolation) of `values` within each group; inf for empty groups."""
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    result = np.full(n_groups, np.inf)
+    present = counts > 0
+    position = (counts[present] - 1) * q / 100
+    low = np.floor(position).astype(int)
+    high = np.ceil(position).astype(int)
+    low_values = ordered[starts[present] + low]
+    result[present] = low_values + (ordered[starts[present] + high] - low_values) * (position - low)
+    return result
+
+
+def semantic_chunk_documents(
+    docs: list[Document],
+    model_name: str = "all-MiniLM-L6-v2",
+    breakpoint_percentile: float = BREAKPOINT_PERCENTILE,
+    buffer_size: int = 1,
+) -> list[Document]:
+    split = [_split_sentences(doc.page_content, buffer_size) for doc in docs]
+    windows = [w for _, doc_windows in split for w in doc_windows]
+    if not windows:
+        return []
+
+    vectors = get_local_embeddings(model_name).embed_documents_array(windows)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+    distances = 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+
+    # Only distances between sentences of the same document are candidate breakpoints, and each
+    # document gets its own threshold so its chunks (and their point ids) do not depend on the batch.
+    doc_ids = np.repeat(np.arange(len(docs)), [len(sentences) for sentences, _ in split])
+    same_doc = doc_ids[:-1] == doc_ids[1:]
+    thresholds = grouped_percentile(distances[same_doc], doc_ids[:-1][same_doc], len(docs), breakpoint_percentile)
+    is_break = same_doc & (distances > thresholds[doc_ids[:-1]])
+
+    chunks = []
+    offset = 0
+    for doc, (sentences, _) in zip(docs, split):
+        start = 0
+        for i in range(len(sentences)):
+            if i == len(sentences) - 1 or is_break[offset + i]:
+                chunks.append(Document(page_content=" ".join(sentences[start:i + 1]), metadata=dict(doc.metadata)))
+                start = i + 1
+        offset += len(sentences)
+    return chunks
+
+
+def iter_chunks(docs, batch_docs: int = CHUNK_BATCH_DOCS, merge: bool = True, **kwargs):
+    docs = iter(merge_small_items(docs) if merge else docs)
+    while batch := list(islice(docs, batch_docs)):
+        yield from semantic_chunk_documents(batch, **kwargs)
+
 
 def semantic_chunking_with_st(text: str, model_name: str = "all-MiniLM-L6-v2") -> list[Document]:
-    embeddings = GeminiEmbeddings()
-    chunker = SemanticChunker(embeddings)
-    return chunker.create_documents([text])
+    return semantic_chunk_documents([Document(page_content=text)], model_name=model_name)
@@ -1,8 +1,12 @@
 import logging
 import time
 import re
+import io
 import json
-import csv
+import os
+import pickle
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from docling_core.types.doc import ImageRefMode, PictureItem, TableItem, TextItem
@@ -10,63 +14,193 @@ from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
 from docling.document_converter import DocumentConverter, PdfFormatOption
 from langchain.schema import Document
+from pypdf import PdfReader, PdfWriter
 
 _log = logging.getLogger(__name__)
 
 pdf_path = "./data/pdf/ifc-annual-report-2024-financials.pdf"
 shorter = "./data/pdf/shorter.pdf"
 IMAGE_RESOLUTION_SCALE = 2.0
+PAGES_PER_RANGE = 10
+DOCLING_CACHE_DIR = Path(os.getenv("DOCLING_CACHE_DIR", "./cache/docling"))
+# Bump when the extracted item format changes.
+DOCLING_CACHE_VERSION = 1
 
+FIGURE_TITLE_RE = re.compile(r"^Figure\s+\d+[:.]?", re.IGNORECASE)
+TABLE_1_TITLE_RE = re.compile(r"^CONSOLIDATED\b.*")
+TABLE_2_TITLE_RE = re.compile(r"SUPPLEMENTAL\b.*")
+TABLE_TITLE_RE = re.compile(r"^Table\s+\d+[:.]?", re.IGNORECASE)
+SECTION_TITLE_RE = re.compile(r"SECTION\s+[A-Z0-9]+\.", re.IGNORECASE)
 
+_converter = None
 
-def main():
-    logging.basicConfig(level=logging.INFO)
-
-    input_doc_path = pdf_path
-    output_dir = Path("scratch")
-    output_dir.mkdir(parents=True, exist_ok=True)
 
+def _build_converter():
     pipeline_options = PdfPipelineOptions()
     pipeline_options.images_scale = IMAGE_RESOLUTION_SCALE
     pipeline_options.generate_page_images = False
     pipeline_options.generate_picture_images = True
 
-    doc_converter = DocumentConverter(
+    return DocumentConverter(
         format_options={
             InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
         }
     )
 
-    start_time = time.time()
-    conv_res = doc_converter.convert(input_doc_path)
-    doc_filename = conv_res.input.file.stem
 
-    FIGURE_TITLE_RE = re.compile(r"^Figure\s+\d+[:.]?", re.IGNORECASE)
-    TABLE_1_TITLE_RE = re.compile(r"^CONSOLIDATED\b.*")
-    TABLE_2_TITLE_RE = re.compile(r"SUPPLEMENTAL\b.*")
-    TABLE_TITLE_RE = re.compile(r"^Table\s+\d+[:.]?", re.IGNORECASE)
-    SECTION_TITLE_RE = re.compile(r"SECTION\s+[A-Z0-9]+\.", re.IGNORECASE)
+def _init_worker():
+    global _converter
+    _converter = _build_converter()
+
+
+def _extract_items(document) -> list[dict]:
+    items = []
+    for element, _ in document.iterate_items():
+        prov = element.prov
+        item = {"kind": "other", "page": prov[0].page_no if prov else None}
+
+        if isinstance(element, TextItem):
+            item["kind"] = "text"
+            item["text"] = element.text.strip()
+        elif isinstance(element, PictureItem):
+            item["kind"] = "picture"
+            buffer = io.BytesIO()
+            element.get_image(document).save(buffer, "PNG")
+            item["png"] = buffer.getvalue()
+        elif isinstance(element, TableItem):
+            item["kind"] = "table"
+            try:
+                item["csv"] = element.export_to_dataframe().to_csv(index=False)
+            except Exception as e:
+                item["error"] = str(e)
+        items.append(item)
+    return items
+
+
+def convert_page_range(input_doc_path: str, page_start: int, page_end: int) -> list[dict]:
+    global _converter
+    if _converter is None:
+        _converter = _build_converter()
+    conv_res = _converter.convert(input_doc_path, page_range=(page_start, page_end))
+    return _extract_items(conv_res.document)
+
+
+def pipeline_options_key() -> str:
+    options = {
+        "cache_version": DOCLING_CACHE_VERSION,
+        "images_scale": IMAGE_RESOLUTION_SCALE,
+        "generate_page_images": False,
+        "generate_picture_images": True,
+    }
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def page_hashes(input_doc_path: str) -> list[str]:
+    hashes = []
+    for page in PdfReader(input_doc_path).pages:
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        hashes.append(hashlib.sha256(buffer.getvalue()).hexdigest())
+    return hashes
+
+
+def split_runs(pages: list[int], pages_per_range: int = PAGES_PER_RANGE) -> list[tuple[int, int]]:
+    ranges = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1 and page - ranges[-1][0] < pages_per_range:
+            ranges[-1] = (ranges[-1][0], page)
+        else:
+            ranges.append((page, page))
+    return ranges
+
+
+def _page_cache_path(page_hash: str) -> Path:
+    return DOCLING_CACHE_DIR / f"page-{page_hash}-{pipeline_options_key()}.pkl"
+
+
+def _load_page(page_hash: str, page_no: int) -> list[dict]:
+    with _page_cache_path(page_hash).open("rb") as f:
+        items = pickle.load(f)
+    # Cached pages are position independent: a page moved by an edit keeps its items.
+    for item in items:
+        item["page"] = page_no if item["page"] is not None else None
+    return items
+
+
+def _save_pages(items: list[dict], start: int, end: int, hashes: list[str]):
+    by_page = {page: [] for page in range(start, end + 1)}
+    current = start
+    for item in items:
+        if item["page"] is not None:
+            current = item["page"]
+        by_page.setdefault(current, []).append(item)
+    for page, page_items in by_page.items():
+        if start <= page <= end:
+            with _page_cache_path(hashes[page - 1]).open("wb") as f:
+                pickle.dump(page_items, f)
+
 
+def iter_items(input_doc_path: str = pdf_path, pages_per_range: int = PAGES_PER_RANGE, max_workers: int = None, use_cache: bool = True):
+    DOCLING_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    doc_hash = hashlib.sha256(Path(input_doc_path).read_bytes()).hexdigest()
+    doc_cache = DOCLING_CACHE_DIR / f"doc-{doc_hash}-{pipeline_options_key()}.pkl"
+    if use_cache and doc_cache.exists():
+        _log.info(f"Loading converted document from cache: {doc_cache}")
+        with doc_cache.open("rb") as f:
+            yield from pickle.load(f)
+        return
+
+    hashes = page_hashes(input_doc_path)
+    cached = {page for page in range(1, len(hashes) + 1) if use_cache and _page_cache_path(hashes[page - 1]).exists()}
+    ranges = split_runs([page for page in range(1, len(hashes) + 1) if page not in cached], pages_per_range)
+    _log.info(f"{len(cached)} of {len(hashes)} pages cached, converting {len(ranges)} page range(s)")
+
+    all_items = []
+    max_workers = max_workers or max(1, min(len(ranges), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+        futures = {start: (end, pool.submit(convert_page_range, input_doc_path, start, end)) for start, end in ranges}
+        page = 1
+        # Walk pages in order so the title state machine sees elements in document order.
+        while page <= len(hashes):
+            if page in cached:
+                items = _load_page(hashes[page - 1], page)
+                page += 1
+            else:
+                end, future = futures[page]
+                items = future.result()
+                _save_pages(items, page, end, hashes)
+                _log.info(f"Converted pages {page}-{end}: {len(items)} items")
+                page = end + 1
+            all_items.extend(items)
+            yield from items
+
+    with doc_cache.open("wb") as f:
+        pickle.dump(all_items, f)
+
+
+def iter_documents(input_doc_path: str = pdf_path, output_dir: str = "scratch", pages_per_range: int = PAGES_PER_RANGE, max_workers: int = None, use_cache: bool = True):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    doc_filename = Path(input_doc_path).stem
+
+    start_time = time.time()
     picture_counter = 0
     table_counter = 0
     image_metadata = []
     table_metadata = []
-    text_metadata = []
 
     current_section_title = None
     current_figure_title = None
     current_table_title = None
     content = "MANAGEMENT’S DISCUSSION AND ANALYSIS"
-    documents = []
-
-
-    for element, _ in conv_res.document.iterate_items():
-        prov = element.prov
-        page_number = prov[0].page_no if prov else None
 
+    for element in iter_items(input_doc_path, pages_per_range, max_workers, use_cache):
+        page_number = element["page"]
 
-        if isinstance(element, TextItem):
-            text = element.text.strip()
+        if element["kind"] == "text":
+            text = element["text"]
             if FIGURE_TITLE_RE.match(text):
                 current_figure_title = text
             if TABLE_TITLE_RE.match(text) or TABLE_1_TITLE_RE.match(text) or TABLE_2_TITLE_RE.match(text):
@@ -80,62 +214,63 @@ def main():
                     "content": content or "Unknown",
                     "page": page_number or -1
                 }
-                documents.append(Document(page_content=text, metadata=text_metadata))
-
-        if page_number <= 4:
-            current_section_title = None
-        if page_number >=57:
-            current_section_title = None
-        if page_number >= 71:
-            current_table_title = None
-            content = "CONSOLIDATED FINANCIAL STATEMENTS AND INTERNAL CONTROL REPORTS"
-        if page_number >= 141:
-            content = "INVESTMENT PORTFOLIO"
-
-    #     if isinstance(element, PictureItem):
-    #         picture_counter += 1
-    #         fn = output_dir / f"{doc_filename}-picture-{picture_counter}.png"
-    #         with fn.open("wb") as fp:
-    #             element.get_image(conv_res.document).save(fp, "PNG")
-    #         image_metadata.append({
-    #             "type": "image",
-    #             "image_path": str(fn),
-    #             "title": current_figure_title or "Unknown",
-    #             "page_number": page_number or -1,
-    #             "section_title": current_section_title or "Unknown",
-    #             "content": content or "Unknown"
-    #         })
-    #         current_figure_title = None
-
-    #     elif isinstance(element, TableItem):
-    #         table_counter += 1
-    #         csv_path = output_dir / f"{doc_filename}-table-{table_counter}.csv"
-
-    #         try:
-    #             df = element.export_to_dataframe()
-    #             df.to_csv(csv_path, index=False)
-    #         except Exception as e:
-    #             _log.warning(f"Failed to export table {table_counter} on page {page_number}: {e}")
-
-    #         table_metadata.append({
-    #             "type": "table",
-    #             "csv": str(csv_path),
-    #             "title": current_table_title or "Unknown",
-    #             "page_number": page_number or -1,
-    #             "section_title": current_section_title or "Unknown",
-    #             "content": content or "Unknown"
-    #         })
-
-
-
-    # with open(output_dir / f"{doc_filename}-figures.json", "w") as f:
-    #     json.dump(image_metadata, f, indent=2)
-
-    # with open(output_dir / f"{doc_filename}-tables.json", "w") as f:
-    #     json.dump(table_metadata, f, indent=2)
+                yield Document(page_content=text, metadata=text_metadata)
+
+        if page_number is not None:
+            if page_number <= 4:
+                current_section_title = None
+            if page_number >= 57:
+                current_section_title = None
+            if page_number >= 71:
+                current_table_title = None
+                content = "CONSOLIDATED FINANCIAL STATEMENTS AND INTERNAL CONTROL REPORTS"
+            if page_number >= 141:
+                content = "INVESTMENT PORTFOLIO"
+
+        if element["kind"] == "picture":
+            picture_counter += 1
+            fn = output_dir / f"{doc_filename}-picture-{picture_counter}.png"
+            fn.write_bytes(element["png"])
+            image_metadata.append({
+                "type": "image",
+                "image_path": str(fn),
+                "title": current_figure_title or "Unknown",
+                "page_number": page_number or -1,
+                "section_title": current_section_title or "Unknown",
+                "content": content or "Unknown"
+            })
+            current_figure_title = None
+
+        elif element["kind"] == "table":
+            table_counter += 1
+            csv_path = output_dir / f"{doc_filename}-table-{table_counter}.csv"
+
+            if "csv" in element:
+                csv_path.write_text(element["csv"])
+            else:
+                _log.warning(f"Failed to export table {table_counter} on page {page_number}: {element['error']}")
+
+            table_metadata.append({
+                "type": "table",
+                "csv": str(csv_path),
+                "title": current_table_title or "Unknown",
+                "page_number": page_number or -1,
+                "section_title": current_section_title or "Unknown",
+                "content": content or "Unknown"
+            })
+
+    with open(output_dir / f"{doc_filename}-figures.json", "w") as f:
+        json.dump(image_metadata, f, indent=2)
+
+    with open(output_dir / f"{doc_filename}-tables.json", "w") as f:
+        json.dump(table_metadata, f, indent=2)
 
     _log.info(f"Document converted. Exported {picture_counter} images and {table_counter} tables in {time.time() - start_time:.2f} seconds.")
 
-    return documents
+
+def main(stream=False):
+    logging.basicConfig(level=logging.INFO)
+    documents = iter_documents(pdf_path)
+    return documents if stream else list(documents)
 
 #main()
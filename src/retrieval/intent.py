@@ -0,0 +1,114 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from retrieval.retriever import search
+from services.gemini import return_metadata
+
+PAGE_RANGE_RE = re.compile(r"\bp(?:ages?|p\.?)\s*(\d{1,3})\s*(?:-|–|—|to|through)\s*(\d{1,3})\b", re.IGNORECASE)
+# "pages 4 and 70", "pages 4, 5 and 6": a list of pages, not a range.
+PAGE_LIST_RE = re.compile(r"\bp(?:ages?|p\.?)\s*(\d{1,3}(?:\s*(?:,|&|and)\s*(?:and\s+)?\d{1,3})+)\b", re.IGNORECASE)
+PAGE_RE = re.compile(r"\bp(?:ages?|\.)\s*(\d{1,3})\b", re.IGNORECASE)
+# Page references the regexes cannot resolve to numbers; these go to the LLM.
+VAGUE_PAGE_RE = re.compile(r"\b(first|last|next|previous|final|opening)\s+pages?\b|\bpages?\s+(?:after|before|following)\b", re.IGNORECASE)
+
+TYPE_KEYWORDS = {
+    "table": re.compile(r"\b(tables?|tabular|columns?|rows?|breakdowns?)\b", re.IGNORECASE),
+    "image": re.compile(r"\b(charts?|graphs?|diagrams?|figures?|plots?|visuals?|visualizations?|infographics?)\b", re.IGNORECASE),
+    "text": re.compile(r"\b(describe|explain|explanation|summary|summarize|summarise|overview)\b", re.IGNORECASE),
+}
+
+INTENT_CACHE_SIZE = 1024
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip("?.! ")
+
+
+def parse_intent(query: str):
+    if VAGUE_PAGE_RE.search(query):
+        return None
+
+    page_start = page_end = None
+    list_match = PAGE_LIST_RE.search(query)
+    range_match = PAGE_RANGE_RE.search(query)
+    if list_match:
+        pages = sorted({int(page) for page in re.findall(r"\d+", list_match.group(1))})
+        # Consecutive pages are a range; scattered ones cannot be one filter, so search all pages.
+        if pages[-1] - pages[0] == len(pages) - 1:
+            page_start, page_end = pages[0], pages[-1]
+    elif range_match:
+        page_start, page_end = sorted((int(range_match.group(1)), int(range_match.group(2))))
+    else:
+        match = PAGE_RE.search(query)
+        if match:
+            page_start = page_end = int(match.group(1))
+
+    types = [type_ for type_, pattern in TYPE_KEYWORDS.items() if pattern.search(query)]
+    if len(types) > 1:
+        return None
+    content_type = types[0] if types else None
+    return query, page_start, page_end, content_type
+
+
+def _cache_get(key):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    return None
+
+
+def _cache_put(key, metadata):
+    with _cache_lock:
+        _cache[key] = metadata
+        _cache.move_to_end(key)
+        while len(_cache) > INTENT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def extract_metadata(user_query: str):
+    key = normalize_query(user_query)
+    metadata = _cache_get(key)
+    if metadata is None:
+        metadata = parse_intent(user_query)
+        if metadata is None:
+            logging.info("Local intent parser undecided, asking the LLM")
+            metadata = return_metadata(user_query)
+        _cache_put(key, metadata)
+    return metadata
+
+
+def local_metadata(user_query: str):
+    key = normalize_query(user_query)
+    metadata = _cache_get(key) or parse_intent(user_query)
+    if metadata is not None:
+        _cache_put(key, metadata)
+    return metadata
+
+
+def remember_metadata(user_query: str, metadata):
+    _cache_put(normalize_query(user_query), metadata)
+
+
+def search_with_intent(vectorstore, user_query: str, k: int = 50):
+    metadata = local_metadata(user_query)
+    if metadata is not None:
+        query, page_start, page_end, type_ = metadata
+        return metadata, search(vectorstore, query, page_start, page_end, type_, k)
+
+    # Undecided: overlap the LLM extraction with an unfiltered search and keep it if no filter comes back.
+    llm_future = _executor.submit(return_metadata, user_query)
+    unfiltered = search(vectorstore, user_query, k=k)
+    metadata = llm_future.result()
+    remember_metadata(user_query, metadata)
+    query, page_start, page_end, type_ = metadata
+    if page_start is None and page_end is None and type_ is None:
+        return metadata, unfiltered
+    return metadata, search(vectorstore, query, page_start, page_end, type_, k)
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from langchain.schema import Document
+
+KEYWORD_INDEX_DIR = os.getenv("KEYWORD_INDEX_DIR", "./cache/keyword_index")
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+THOUSANDS_RE = re.compile(r"(?<=\d),(?=\d{3}\b)")
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from had has have how in is it its of on or the their this to "
+    "s was were what when where which who why with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    # "1,485" and "1485" should match, so drop thousands separators before splitting.
+    text = THOUSANDS_RE.sub("", text.lower())
+    return [token for token in TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """In-process BM25 over the same points as a Qdrant collection, persisted next to the index manifest."""
+
+    def __init__(self, alias: str, index_dir: str = KEYWORD_INDEX_DIR):
+        self.alias = alias
+        self.path = Path(index_dir) / f"{alias}.json"
+        self.collection = None
+        self.documents = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            self._mtime = self.path.stat().st_mtime
+            self.collection = data["collection"]
+            self.documents = data["documents"]
+        self._build()
+
+    def reload_if_changed(self):
+        if self.path.exists() and self.path.stat().st_mtime != self._mtime:
+            with self._lock:
+                self._load()
+            logging.info(f"Reloaded keyword index for '{self.alias}' ({len(self.documents)} documents)")
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"collection": self.collection, "documents": self.documents}, default=str))
+        tmp_path.replace(self.path)
+        self._mtime = self.path.stat().st_mtime
+
+    def _build(self):
+        self.ids = list(self.documents)
+        postings = {}
+        lengths = np.zeros(len(self.ids), dtype=np.float32)
+        pages = np.full(len(self.ids), np.nan)
+        types = []
+        for i, pid in enumerate(self.ids):
+            payload = self.documents[pid]
+            counts = Counter(tokenize(payload["page_content"]))
+            lengths[i] = sum(counts.values())
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((i, tf))
+            metadata = payload.get("metadata") or {}
+            if isinstance(metadata.get("page"), (int, float)):
+                pages[i] = metadata["page"]
+            types.append(metadata.get("type"))
+
+        self.postings = {
+            token: (np.array([i for i, _ in entries], dtype=np.int32), np.array([tf for _, tf in entries], dtype=np.float32))
+            for token, entries in postings.items()
+        }
+        self.lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        self.pages = pages
+        self.types = np.array(types, dtype=object)
+
+    def update(self, collection: str, added: dict, removed):
+        for pid in removed:
+            self.documents.pop(pid, None)
+        for pid, doc in added.items():
+            self.documents[pid] = {"page_content": doc.page_content, "metadata": doc.metadata}
+        self.collection = collection
+        self._build()
+
+    def rebuild(self, client, collection: str, batch_size: int = 256):
+        documents = {}
+        offset = None
+        while True:
+            records, offset = client.scroll(collection_name=collection, limit=batch_size, offset=offset, with_payload=True, with_vectors=False)
+            for record in records:
+                documents[str(record.id)] = {"page_content": record.payload.get("page_content", ""), "metadata": record.payload.get("metadata") or {}}
+            if offset is None:
+                break
+        self.documents = documents
+        self.collection = collection
+        self._build()
+        logging.info(f"Rebuilt keyword index for '{self.alias}' from '{collection}' ({len(documents)} documents)")
+
+    def _mask(self, page_start=None, page_end=None, type_=None, pages=None):
+        # Same semantics as retriever.build_filter: inclusive page range, exact type match.
+        mask = np.ones(len(self.ids), dtype=bool)
+        if page_start is not None:
+            mask &= self.pages >= page_start
+        if page_end is not None:
+            mask &= self.pages <= page_end
+        if pages is not None:
+            mask &= np.isin(self.pages, pages)
+        if type_ is not None:
+            mask &= self.types == type_
+        return mask
+
+    def count(self, page_start=None, page_end=None, type_=None, pages=None) -> int:
+        with self._lock:
+            return int(self._mask(page_start, page_end, type_, pages).sum())
+
+    def search(self, query: str, page_start=None, page_end=None, type_=None, k: int = 50, pages=None) -> list[tuple[Document, float]]:
+        with self._lock:
+            if not self.ids:
+                return []
+            n = len(self.ids)
+            scores = np.zeros(n, dtype=np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.avg_length, 1e-6))
+            for token in set(tokenize(query)):
+                if token not in self.postings:
+                    continue
+                idx, tf = self.postings[token]
+                idf = np.log(1 + (n - len(idx) + 0.5) / (len(idx) + 0.5))
+                scores[idx] += idf * tf * (BM25_K1 + 1) / (tf + norm[idx])
+
+            scores[~self._mask(page_start, page_end, type_, pages)] = 0.0
+            candidates = np.flatnonzero(scores > 0)
+            top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+
+            results = []
+            for i in top:
+                pid = self.ids[i]
+                payload = self.documents[pid]
+                metadata = dict(payload.get("metadata") or {}, _id=pid, _collection_name=self.collection)
+                results.append((Document(page_content=payload["page_content"], metadata=metadata), float(scores[i])))
+            return results
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_keyword_index(alias: str) -> BM25Index:
+    with _indexes_lock:
+        if alias not in _indexes:
+            _indexes[alias] = BM25Index(alias)
+        index = _indexes[alias]
+    index.reload_if_changed()
+    return index
@@ -0,0 +1,395 @@
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+from qdrant_client.models import AliasDescription, CollectionsAliasesResponse, CountResult, Record, ScoredPoint
+
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./data/index")
+# Payload fields with precomputed bitmaps; filters on anything else are rejected.
+BITMAP_FIELDS = ("page", "type", "section", "content")
+
+
+class _Collection:
+    def __init__(self, path: Path, size: int = None, datatype: str = "float32", quantization: str = None):
+        self.path = path
+        self.size = size
+        self.datatype = datatype
+        self.quantization = quantization
+        self.dirty = False
+        self._pending = False
+        self._rows = None
+        self._payload_file = None
+        self._payload_map = None
+        self.codes = None
+        if (path / "vectors.npy").exists():
+            self._open()
+        else:
+            self._rows = {}
+            self.ids = []
+            self.vectors = np.zeros((0, size or 0), dtype=np.float32)
+            self.positions = {}
+            self.bitmaps = {}
+
+    def _open(self):
+        meta = json.loads((self.path / "meta.json").read_text()) if (self.path / "meta.json").exists() else {}
+        self.datatype = meta.get("datatype", "float32")
+        self.quantization = meta.get("quantization")
+        # Originals stay memory-mapped; only the int8 codes are read into RAM.
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.codes = np.load(self.path / "codes.npy") if (self.path / "codes.npy").exists() else None
+        self.size = self.vectors.shape[1]
+        self.ids = json.loads((self.path / "ids.json").read_text())
+        self.positions = {pid: i for i, pid in enumerate(self.ids)}
+        self.offsets = np.load(self.path / "payload_offsets.npy")
+        self._payload_file = open(self.path / "payloads.jsonl", "rb")
+        if self.offsets[-1] > 0:
+            self._payload_map = mmap.mmap(self._payload_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.bitmaps = {}
+        with np.load(self.path / "bitmaps.npz") as data:
+            for field in BITMAP_FIELDS:
+                if f"{field}_values" in data:
+                    values = data[f"{field}_values"]
+                    bits = np.unpackbits(data[f"{field}_bits"], axis=1, count=len(self.ids)).astype(bool)
+                    self.bitmaps[field] = (values, bits)
+
+    def payload(self, i: int) -> dict:
+        if self._rows is not None:
+            return self._rows[self.ids[i]][1]
+        return json.loads(self._payload_map[self.offsets[i]:self.offsets[i + 1]])
+
+    def _materialize(self):
+        if self._rows is None:
+            self._rows = {pid: (np.array(self.vectors[i]), self.payload(i)) for i, pid in enumerate(self.ids)}
+
+    def upsert(self, ids, vectors: np.ndarray, payloads):
+        self._materialize()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+        for pid, vector, payload in zip(ids, vectors, payloads):
+            self._rows[str(pid)] = (vector, payload or {})
+        # The indexer upserts in small batches, so stacking and bitmaps wait for the next read or flush.
+        self._pending = True
+        # The int8 codes describe the last flushed rows; score exactly until flush re-quantizes.
+        self.codes = None
+        self.dirty = True
+
+    def delete(self, ids):
+        self._materialize()
+        for pid in ids:
+            self._rows.pop(str(pid), None)
+        self._pending = True
+        self.codes = None
+        self.dirty = True
+
+    def refresh(self):
+        if not self._pending:
+            return
+        self.ids = list(self._rows)
+        self.positions = {pid: i for i, pid in enumerate(self.ids)}
+        self.vectors = np.stack([v for v, _ in self._rows.values()]) if self._rows else np.zeros((0, self.size), dtype=np.float32)
+        self.bitmaps = self._build_bitmaps([payload for _, payload in self._rows.values()])
+        self._pending = False
+
+    @staticmethod
+    def _build_bitmaps(payloads: list[dict]) -> dict:
+        bitmaps = {}
+        for field in BITMAP_FIELDS:
+            column = [(p.get("metadata") or {}).get(field) for p in payloads]
+            values = sorted({v for v in column if v is not None}, key=str)
+            if not values:
+                continue
+            index = {value: row for row, value in enumerate(values)}
+            bits = np.zeros((len(values), len(payloads)), dtype=bool)
+            for i, value in enumerate(column):
+                if value is not None:
+                    bits[index[value], i] = True
+            values = np.array(values) if field == "page" else np.array([str(v) for v in values])
+            bitmaps[field] = (values, bits)
+        return bitmaps
+
+    def flush(self):
+        if not self.dirty:
+            return
+        self.refresh()
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / "meta.json").write_text(json.dumps({"datatype": self.datatype, "quantization": self.quantization}))
+        np.save(self.path / "vectors.npy", np.ascontiguousarray(self.vectors, dtype=np.dtype(self.datatype)))
+        if self.quantization == "int8" and len(self.vectors):
+            np.save(self.path / "codes.npy", quantize_int8(self.vectors))
+        (self.path / "ids.json").write_text(json.dumps(self.ids))
+        offsets = [0]
+        with open(self.path / "payloads.jsonl", "wb") as f:
+            for pid in self.ids:
+                line = (json.dumps(self._rows[pid][1], default=str) + "\n").encode("utf-8")
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(self.path / "payload_offsets.npy", np.array(offsets, dtype=np.int64))
+        arrays = {}
+        for field, (values, bits) in self.bitmaps.items():
+            arrays[f"{field}_values"] = values
+            arrays[f"{field}_bits"] = np.packbits(bits, axis=1)
+        np.savez(self.path / "bitmaps.npz", **arrays)
+        self.close()
+        self._rows = None
+        self.dirty = False
+        self._open()
+
+    def close(self):
+        if self._payload_map is not None:
+            self._payload_map.close()
+            self._payload_map = None
+        if self._payload_file is not None:
+            self._payload_file.close()
+            self._payload_file = None
+
+    def _condition_mask(self, condition) -> np.ndarray:
+        field = condition.key.removeprefix("metadata.")
+        if field not in self.bitmaps:
+            if field in BITMAP_FIELDS:
+                return np.zeros(len(self.ids), dtype=bool)
+            raise ValueError(f"Local index has no bitmap for filter key '{condition.key}'")
+        values, bits = self.bitmaps[field]
+        if condition.range is not None:
+            rng = condition.range
+            selected = np.ones(len(values), dtype=bool)
+            if rng.gte is not None:
+                selected &= values >= rng.gte
+            if rng.gt is not None:
+                selected &= values > rng.gt
+            if rng.lte is not None:
+                selected &= values <= rng.lte
+            if rng.lt is not None:
+                selected &= values < rng.lt
+            return bits[selected].any(axis=0)
+        if condition.match is not None and hasattr(condition.match, "value"):
+            target = condition.match.value if field == "page" else str(condition.match.value)
+            rows = np.flatnonzero(values == target)
+            return bits[rows[0]] if len(rows) else np.zeros(len(self.ids), dtype=bool)
+        if condition.match is not None and hasattr(condition.match, "any"):
+            targets = condition.match.any if field == "page" else [str(v) for v in condition.match.any]
+            return bits[np.isin(values, targets)].any(axis=0)
+        raise ValueError(f"Unsupported filter condition on '{condition.key}' for the local index")
+
+    def mask(self, query_filter) -> np.ndarray:
+        if query_filter is None:
+            return None
+        if query_filter.should or query_filter.must_not:
+            raise ValueError("Local index only supports 'must' filters")
+        mask = np.ones(len(self.ids), dtype=bool)
+        for condition in query_filter.must or []:
+            mask &= self._condition_mask(condition)
+        return mask
+
+    def search(self, query_vector, query_filter=None, limit: int = 10, search_params=None):
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        mask = self.mask(query_filter)
+        candidates = np.arange(len(self.ids)) if mask is None else np.flatnonzero(mask)
+
+        quantization = getattr(search_params, "quantization", None)
+        use_codes = self.codes is not None and not getattr(search_params, "exact", False) and not getattr(quantization, "ignore", False)
+        if use_codes:
+            # int8 codes preserve the ranking of the dequantized dot product, so rank on them and
+            # rescore an oversampled shortlist against the float originals.
+            oversampling = getattr(quantization, "oversampling", None) or 1.0
+            approx = self.codes[candidates].astype(np.float32) @ query
+            candidates = np.sort(candidates[_top(approx, int(np.ceil(limit * oversampling)))])
+        rows = self.vectors if mask is None and not use_codes else self.vectors[candidates]
+        scores = np.asarray(rows @ query, dtype=np.float32)
+        top = _top(scores, limit)
+        return candidates[top], scores[top]
+
+
+def _top(scores: np.ndarray, limit: int) -> np.ndarray:
+    if limit < len(scores):
+        top = np.argpartition(-scores, limit)[:limit]
+        return top[np.argsort(-scores[top], kind="stable")]
+    return np.argsort(-scores, kind="stable")
+
+
+def quantize_int8(vectors: np.ndarray, quantile: float = 0.99) -> np.ndarray:
+    low, high = np.quantile(vectors, [(1 - quantile) / 2, (1 + quantile) / 2])
+    scale = (high - low) / 255 or 1.0
+    return (np.clip(np.round((vectors - low) / scale), 0, 255) - 128).astype(np.int8)
+
+
+class LocalVectorIndex:
+    """In-process exact vector search over memory-mapped collections, exposing the subset of the
+    QdrantClient API the indexer and retriever use."""
+
+    def __init__(self, path: str = LOCAL_INDEX_PATH):
+        self.root = Path(path)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._collections = {}
+        self._aliases = {}
+        self._aliases_mtime = None
+        self._lock = threading.RLock()
+        self._load_aliases()
+
+    def _aliases_path(self) -> Path:
+        return self.root / "aliases.json"
+
+    def _load_aliases(self):
+        path = self._aliases_path()
+        if path.exists() and path.stat().st_mtime != self._aliases_mtime:
+            self._aliases = json.loads(path.read_text())
+            self._aliases_mtime = path.stat().st_mtime
+
+    def _resolve(self, name: str) -> str:
+        with self._lock:
+            self._load_aliases()
+            return self._aliases.get(name, name)
+
+    def _collection(self, name: str) -> _Collection:
+        name = self._resolve(name)
+        with self._lock:
+            if name not in self._collections:
+                path = self.root / name
+                if not path.exists():
+                    raise ValueError(f"Collection '{name}' not found")
+                self._collections[name] = _Collection(path)
+                logging.info(f"Mapped local collection '{name}' ({len(self._collections[name].ids)} points)")
+            return self._collections[name]
+
+    def _readable(self, name: str) -> _Collection:
+        collection = self._collection(name)
+        with self._lock:
+            collection.refresh()
+        return collection
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return collection_name in self._collections or (self.root / collection_name).exists()
+
+    def create_collection(self, collection_name: str, vectors_config, quantization_config=None, **kwargs):
+        # HNSW settings do not apply: search here is exact (or int8 shortlist + exact rescoring).
+        quantization = None
+        if quantization_config is not None:
+            if getattr(quantization_config, "product", None) is not None:
+                logging.warning("Local index has no product quantization, using int8 scalar quantization instead")
+            quantization = "int8"
+        datatype = getattr(vectors_config.datatype, "value", None) or "float32"
+        with self._lock:
+            self._collections[collection_name] = _Collection(
+                self.root / collection_name, size=vectors_config.size, datatype=datatype, quantization=quantization
+            )
+            self._collections[collection_name].dirty = True
+
+    def delete_collection(self, collection_name: str):
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(self.root / collection_name, ignore_errors=True)
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs):
+        # Bitmaps for BITMAP_FIELDS are always built on flush; anything else cannot be filtered on.
+        if field_name.removeprefix("metadata.") not in BITMAP_FIELDS:
+            raise ValueError(f"Local index cannot index payload field '{field_name}'")
+
+    def count(self, collection_name: str, count_filter=None, **kwargs) -> CountResult:
+        collection = self._readable(collection_name)
+        mask = collection.mask(count_filter)
+        return CountResult(count=len(collection.ids) if mask is None else int(mask.sum()))
+
+    def upsert(self, collection_name: str, points, **kwargs):
+        collection = self._collection(collection_name)
+        with self._lock:
+            collection.upsert([p.id for p in points], [p.vector for p in points], [p.payload for p in points])
+
+    def upload_collection(self, collection_name: str, vectors, payload=None, ids=None, **kwargs):
+        collection = self._collection(collection_name)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            collection.upsert(ids, vectors, payload or [{}] * len(vectors))
+
+    def delete(self, collection_name: str, points_selector, **kwargs):
+        collection = self._collection(collection_name)
+        with self._lock:
+            collection.delete(points_selector.points)
+
+    def flush(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.flush()
+
+    def get_aliases(self) -> CollectionsAliasesResponse:
+        with self._lock:
+            self._load_aliases()
+            return CollectionsAliasesResponse(aliases=[
+                AliasDescription(alias_name=alias, collection_name=name) for alias, name in self._aliases.items()
+            ])
+
+    def update_collection_aliases(self, change_aliases_operations, **kwargs):
+        with self._lock:
+            # Collections must be on disk before an alias can point readers at them.
+            self.flush()
+            for operation in change_aliases_operations:
+                if getattr(operation, "delete_alias", None) is not None:
+                    self._aliases.pop(operation.delete_alias.alias_name, None)
+                if getattr(operation, "create_alias", None) is not None:
+                    self._aliases[operation.create_alias.alias_name] = operation.create_alias.collection_name
+            tmp_path = self._aliases_path().with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self._aliases, indent=2))
+            tmp_path.replace(self._aliases_path())
+            self._aliases_mtime = self._aliases_path().stat().st_mtime
+
+    def _record(self, collection: _Collection, i: int, with_payload: bool, with_vectors: bool) -> Record:
+        return Record(
+            id=collection.ids[i],
+            payload=collection.payload(i) if with_payload else None,
+            vector=np.asarray(collection.vectors[i], dtype=np.float32).tolist() if with_vectors else None,
+        )
+
+    def retrieve(self, collection_name: str, ids, with_payload: bool = True, with_vectors: bool = False, **kwargs) -> list[Record]:
+        collection = self._readable(collection_name)
+        positions = [collection.positions[str(pid)] for pid in ids if str(pid) in collection.positions]
+        return [self._record(collection, i, with_payload, with_vectors) for i in positions]
+
+    def scroll(self, collection_name: str, limit: int = 10, offset=None, with_payload: bool = True, with_vectors: bool = False, **kwargs):
+        collection = self._readable(collection_name)
+        start = offset or 0
+        end = min(start + limit, len(collection.ids))
+        records = [self._record(collection, i, with_payload, with_vectors) for i in range(start, end)]
+        return records, (end if end < len(collection.ids) else None)
+
+    def search(self, collection_name: str, query_vector, query_filter=None, search_params=None, limit: int = 10, with_payload: bool = True, with_vectors: bool = False, **kwargs) -> list[ScoredPoint]:
+        collection = self._readable(collection_name)
+        positions, scores = collection.search(query_vector, query_filter, limit, search_params)
+        return [
+            ScoredPoint(
+                id=collection.ids[i],
+                version=0,
+                score=float(score),
+                payload=collection.payload(i) if with_payload else None,
+                vector=np.asarray(collection.vectors[i], dtype=np.float32).tolist() if with_vectors else None,
+            )
+            for i, score in zip(positions, scores)
+        ]
+
+
+class AsyncLocalVectorIndex:
+    """Awaitable facade over an in-process index (LocalVectorIndex or embedded Qdrant); searches
+    are sub-millisecond so they run inline."""
+
+    def __init__(self, index: LocalVectorIndex):
+        self.index = index
+
+    def __getattr__(self, name):
+        method = getattr(self.index, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class LocalVectorStore:
+    # LangChain's Qdrant wrapper rejects non-Qdrant clients; callers only use these three attributes.
+    def __init__(self, client, collection_name: str, embeddings):
+        self.client = client
+        self.collection_name = collection_name
+        self.embeddings = embeddings
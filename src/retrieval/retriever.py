@@ -1,7 +1,31 @@
-from qdrant_client.models import Filter, FieldCondition, MatchValue, Range
+import os
+from functools import lru_cache
+from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue, Range
+from langchain.schema import Document
 import logging
 
-def retrieve(vectorstore, query, page_start=None, page_end=None, type_=None):
+from embedding.vector_profiles import VECTOR_PROFILE, search_params
+from retrieval.keyword_index import get_keyword_index
+
+# "hybrid" fuses dense hits with the local BM25 index; "dense" is vector search only.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+DENSE_K = 50
+HYBRID_K = 20
+RRF_K = 60
+# Filters matching at most this many points are scored exactly instead of walking the HNSW graph,
+# which loses recall when most of its neighbours are filtered out.
+EXACT_SEARCH_MAX_POINTS = 1000
+# Coarse-to-fine: pick the best page/section summaries first, then search chunks on their pages only.
+# Off until the coarse_to_fine benchmark config matches hybrid_rerank recall.
+COARSE_TO_FINE = os.getenv("COARSE_TO_FINE", "false").lower() == "true"
+COARSE_K = 5
+FINE_K = 15
+SUMMARY_SUFFIX = "_summaries"
+
+
+@lru_cache(maxsize=1024)
+def build_filter(page_start=None, page_end=None, type_=None, pages=None):
     conditions = []
 
     if page_start is not None or page_end is not None:
@@ -17,6 +41,14 @@ def retrieve(vectorstore, query, page_start=None, page_end=None, type_=None):
             )
         )
 
+    if pages is not None:
+        conditions.append(
+            FieldCondition(
+                key="metadata.page",
+                match=MatchAny(any=list(pages))
+            )
+        )
+
     if type_ is not None:
         conditions.append(
             FieldCondition(
@@ -25,61 +57,182 @@ def retrieve(vectorstore, query, page_start=None, page_end=None, type_=None):
             )
         )
 
-    filter_ = Filter(must=conditions) if conditions else None
+    return Filter(must=conditions) if conditions else None
 
-    retriever = vectorstore.as_retriever(
-        search_type="similarity",
-        search_kwargs={
-            "k": 50,
-            "filter": filter_
-        }
-    )
-    return retriever.get_relevant_documents(query)
 
+def point_to_document(point, collection_name=None) -> Document:
+    metadata = dict(point.payload.get("metadata") or {})
+    metadata["_id"] = point.id
+    if collection_name is not None:
+        metadata["_collection_name"] = collection_name
+    return Document(page_content=point.payload.get("page_content", ""), metadata=metadata)
 
 
-def search_with_scores(client, embedding_model, query, collection_name, page_start=None, page_end=None, type_=None):
-    vector = embedding_model.embed_query(query)
+def summary_alias(collection_name: str) -> str:
+    return f"{collection_name}{SUMMARY_SUFFIX}"
 
-    conditions = []
 
-    if page_start is not None or page_end is not None:
-        range_args = {}
-        if page_start is not None:
-            range_args["gte"] = page_start
-        if page_end is not None:
-            range_args["lte"] = page_end
-        conditions.append(
-            FieldCondition(
-                key="metadata.page",
-                range=Range(**range_args)
-            )
-        )
+def _local_cardinality(collection_name, page_start, page_end, type_, pages=None):
+    keyword_index = get_keyword_index(collection_name)
+    return keyword_index.count(page_start, page_end, type_, pages) if keyword_index.ids else None
 
 
-    if type_ is not None:
-        conditions.append(
-            FieldCondition(
-                key="metadata.type",
-                match=MatchValue(value=type_)
-            )
-        )
+def _use_exact(cardinality, strategy: str) -> bool:
+    if strategy != "auto":
+        return strategy == "exact"
+    return cardinality is not None and cardinality <= EXACT_SEARCH_MAX_POINTS
+
 
-    filter_ = Filter(must=conditions) if conditions else None
+def plan_search(client, collection_name, page_start=None, page_end=None, type_=None, strategy="auto", pages=None) -> bool:
+    """Returns True when the filtered search should score the matching points exactly."""
+    if strategy == "auto" and page_start is None and page_end is None and type_ is None and pages is None:
+        return False
+    cardinality = None
+    if strategy == "auto":
+        # The keyword index mirrors the collection, so it counts matches without a round trip.
+        cardinality = _local_cardinality(collection_name, page_start, page_end, type_, pages)
+        if cardinality is None:
+            cardinality = client.count(collection_name=collection_name, count_filter=build_filter(page_start, page_end, type_, pages), exact=False).count
+    return _use_exact(cardinality, strategy)
 
-    results = client.search(
+
+async def aplan_search(client, collection_name, page_start=None, page_end=None, type_=None, strategy="auto", pages=None) -> bool:
+    if strategy == "auto" and page_start is None and page_end is None and type_ is None and pages is None:
+        return False
+    cardinality = None
+    if strategy == "auto":
+        cardinality = _local_cardinality(collection_name, page_start, page_end, type_, pages)
+        if cardinality is None:
+            cardinality = (await client.count(collection_name=collection_name, count_filter=build_filter(page_start, page_end, type_, pages), exact=False)).count
+    return _use_exact(cardinality, strategy)
+
+
+def search_by_vector(client, collection_name, vector, page_start=None, page_end=None, type_=None, k=50, ef=None, strategy="auto", pages=None) -> list[tuple[Document, float]]:
+    exact = plan_search(client, collection_name, page_start, page_end, type_, strategy, pages)
+    points = client.search(
+        collection_name=collection_name,
+        query_vector=vector,
+        query_filter=build_filter(page_start, page_end, type_, pages),
+        search_params=search_params(VECTOR_PROFILE, ef, exact),
+        limit=k,
+        with_payload=True,
+        with_vectors=False
+    )
+    return [(point_to_document(point, collection_name), point.score) for point in points]
+
+
+async def asearch_by_vector(client, collection_name, vector, page_start=None, page_end=None, type_=None, k=50, ef=None, strategy="auto", pages=None) -> list[tuple[Document, float]]:
+    exact = await aplan_search(client, collection_name, page_start, page_end, type_, strategy, pages)
+    points = await client.search(
         collection_name=collection_name,
         query_vector=vector,
-        query_filter=filter_,
-        limit=5,
+        query_filter=build_filter(page_start, page_end, type_, pages),
+        search_params=search_params(VECTOR_PROFILE, ef, exact),
+        limit=k,
         with_payload=True,
         with_vectors=False
     )
+    return [(point_to_document(point, collection_name), point.score) for point in points]
+
+
+def reciprocal_rank_fusion(result_lists, k: int = RRF_K, limit: int = None) -> list[tuple[Document, float]]:
+    fused = {}
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results, start=1):
+            entry = fused.setdefault(str(doc.metadata.get("_id")), [doc, 0.0])
+            entry[1] += 1.0 / (k + rank)
+    ranked = sorted(fused.values(), key=lambda entry: -entry[1])
+    return [(doc, score) for doc, score in ranked[:limit]]
+
+
+def _keep_vector_scores(dense):
+    # Fused results are ranked by RRF score, which carries no notion of how far apart the dense
+    # hits are; the rerank cascade reads the cosine scores from here instead.
+    for doc, score in dense:
+        doc.metadata["_vector_score"] = score
+    return dense
+
+
+def hybrid_search_by_vector(client, collection_name, vector, query, page_start=None, page_end=None, type_=None, k=HYBRID_K, strategy="auto", pages=None) -> list[tuple[Document, float]]:
+    keyword_index = get_keyword_index(collection_name)
+    if not keyword_index.ids:
+        # No keyword index to recover exact-term matches, so keep the wider dense candidate pool.
+        return search_by_vector(client, collection_name, vector, page_start, page_end, type_, max(k, DENSE_K), strategy=strategy, pages=pages)
+    dense = _keep_vector_scores(search_by_vector(client, collection_name, vector, page_start, page_end, type_, k, strategy=strategy, pages=pages))
+    sparse = keyword_index.search(query, page_start, page_end, type_, k, pages)
+    return reciprocal_rank_fusion([dense, sparse], limit=k)
+
+
+async def ahybrid_search_by_vector(client, collection_name, vector, query, page_start=None, page_end=None, type_=None, k=HYBRID_K, strategy="auto", pages=None) -> list[tuple[Document, float]]:
+    keyword_index = get_keyword_index(collection_name)
+    if not keyword_index.ids:
+        return await asearch_by_vector(client, collection_name, vector, page_start, page_end, type_, max(k, DENSE_K), strategy=strategy, pages=pages)
+    dense = _keep_vector_scores(await asearch_by_vector(client, collection_name, vector, page_start, page_end, type_, k, strategy=strategy, pages=pages))
+    sparse = keyword_index.search(query, page_start, page_end, type_, k, pages)
+    return reciprocal_rank_fusion([dense, sparse], limit=k)
+
+
+def summary_pages(points) -> tuple:
+    pages = set()
+    for point in points:
+        pages.update((point.payload.get("metadata") or {}).get("pages") or [])
+    return tuple(sorted(pages))
+
+
+def _missing_collection(error: Exception) -> bool:
+    # Qdrant servers answer 404; embedded Qdrant and the local index raise ValueError("... not found").
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code == 404
+    return isinstance(error, ValueError) and "not found" in str(error)
+
+
+def coarse_to_fine_search(client, collection_name, vector, query, type_=None, k=FINE_K, coarse_k=COARSE_K, mode=RETRIEVAL_MODE):
+    """Returns None when there is no summary index to narrow the search with."""
+    try:
+        points = client.search(collection_name=summary_alias(collection_name), query_vector=vector, limit=coarse_k, with_payload=True)
+    except (UnexpectedResponse, ValueError) as e:
+        if not _missing_collection(e):
+            logging.warning(f"Coarse search on '{summary_alias(collection_name)}' failed: {e}")
+            raise
+        return None
+    pages = summary_pages(points)
+    if not pages:
+        return None
+    if mode == "hybrid":
+        return hybrid_search_by_vector(client, collection_name, vector, query, type_=type_, k=k, pages=pages)
+    return search_by_vector(client, collection_name, vector, type_=type_, k=k, pages=pages)
+
+
+async def acoarse_to_fine_search(client, collection_name, vector, query, type_=None, k=FINE_K, coarse_k=COARSE_K, mode=RETRIEVAL_MODE):
+    try:
+        points = await client.search(collection_name=summary_alias(collection_name), query_vector=vector, limit=coarse_k, with_payload=True)
+    except (UnexpectedResponse, ValueError) as e:
+        if not _missing_collection(e):
+            logging.warning(f"Coarse search on '{summary_alias(collection_name)}' failed: {e}")
+            raise
+        return None
+    pages = summary_pages(points)
+    if not pages:
+        return None
+    if mode == "hybrid":
+        return await ahybrid_search_by_vector(client, collection_name, vector, query, type_=type_, k=k, pages=pages)
+    return await asearch_by_vector(client, collection_name, vector, type_=type_, k=k, pages=pages)
+
+
+def search(vectorstore, query, page_start=None, page_end=None, type_=None, k=50, mode=RETRIEVAL_MODE) -> list[tuple[Document, float]]:
+    vector = vectorstore.embeddings.embed_query(query)
+    if mode == "hybrid":
+        return hybrid_search_by_vector(vectorstore.client, vectorstore.collection_name, vector, query, page_start, page_end, type_, k)
+    return search_by_vector(vectorstore.client, vectorstore.collection_name, vector, page_start, page_end, type_, k)
+
+
+def retrieve(vectorstore, query, page_start=None, page_end=None, type_=None, k=50):
+    return [doc for doc, _ in search(vectorstore, query, page_start, page_end, type_, k)]
+
 
-    for point in results:
-        logging.info(f"Score: {point.score:.4f}")
-        logging.info(f"Page content: {point.payload["page_content"][:100]}...")
-        logging.info(f"Metadata: {point.payload["metadata"]}")
+def log_scores(results, n=5):
+    for doc, score in results[:n]:
+        logging.info(f"Score: {score:.4f}")
+        logging.info(f"Page content: {doc.page_content[:100]}...")
+        logging.info(f"Metadata: {doc.metadata}")
         logging.info("---")
-    
-    return results
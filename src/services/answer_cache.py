@@ -0,0 +1,135 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from retrieval.intent import normalize_query, parse_intent
+from retrieval.keyword_index import THOUSANDS_RE
+
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_TTL_SECONDS = 6 * 60 * 60
+ANSWER_CACHE_MAX_ENTRIES = 512
+VERSION_CHECK_SECONDS = 30
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def query_signature(query: str):
+    # "net income on page 12" and "... page 13", or "... in 2024" and "... in 2023", embed almost
+    # identically; a semantic hit must also agree on the parsed filters and every number asked about.
+    intent = parse_intent(query)
+    if intent is None:
+        return None
+    _, page_start, page_end, type_ = intent
+    numbers = tuple(sorted(set(NUMBER_RE.findall(THOUSANDS_RE.sub("", query)))))
+    return page_start, page_end, type_, numbers
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        embeddings,
+        version_fn=None,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.embeddings = embeddings
+        self.version_fn = version_fn
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys = []
+        self._matrix = None
+        self._version = None
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+
+    def _check_version(self):
+        if self.version_fn is None or time.monotonic() - self._version_checked < VERSION_CHECK_SECONDS:
+            return
+        version = self.version_fn()
+        self._version_checked = time.monotonic()
+        if version != self._version:
+            if self._entries:
+                logging.info(f"Collection version changed to {version}, clearing answer cache")
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _index(self):
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.vstack([self._entries[key]["vector"] for key in self._keys]) if self._keys else None
+        return self._keys, self._matrix
+
+    def _normalize(self, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def _vector(self, query: str) -> np.ndarray:
+        return self._normalize(self.embeddings.embed_query(query))
+
+    def get(self, query: str, vector=None):
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        signature = query_signature(query)
+        if signature is None:
+            # Vague references ("the last page") only reuse answers for the exact same question.
+            with self._lock:
+                self.misses += 1
+            return None
+
+        vector = self._normalize(vector) if vector is not None else self._vector(query)
+        with self._lock:
+            keys, matrix = self._index()
+            if matrix is not None:
+                similarities = matrix @ vector
+                for best in np.argsort(-similarities, kind="stable"):
+                    if similarities[best] < self.threshold:
+                        break
+                    entry = self._entries.get(keys[best])
+                    if entry is not None and entry["signature"] == signature:
+                        self._entries.move_to_end(keys[best])
+                        self.semantic_hits += 1
+                        logging.info(f"Answer cache semantic hit ({similarities[best]:.3f}): '{keys[best]}'")
+                        return entry
+            self.misses += 1
+        return None
+
+    def put(self, query: str, answer: str, chunks: list, vector=None):
+        key = normalize_query(query)
+        vector = self._normalize(vector) if vector is not None else self._vector(query)
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer, "chunks": chunks, "vector": vector, "signature": query_signature(query), "created": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses, "entries": len(self._entries)}
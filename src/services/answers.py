@@ -0,0 +1,14 @@
+NO_ANSWER_MESSAGES = (
+    "The document does not provide this information.",
+    "This question is not related to the IFC Annual Report 2024.",
+    "The answer is not in the provided pages.",
+)
+
+
+def is_no_answer(text: str) -> bool:
+    return text.strip() in NO_ANSWER_MESSAGES
+
+
+def may_be_no_answer(partial_text: str) -> bool:
+    partial_text = partial_text.strip()
+    return any(message.startswith(partial_text) for message in NO_ANSWER_MESSAGES)
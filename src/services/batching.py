@@ -0,0 +1,53 @@
+import asyncio
+
+
+class AsyncBatcher:
+    def __init__(self, batch_fn, max_batch_size: int = 32, max_wait_ms: float = 5):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._flush_handle = None
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class BatchedQueryEmbeddings:
+    """Coalesces concurrent aembed_query calls into one embedding request."""
+
+    def __init__(self, embeddings, max_batch_size: int = 32, max_wait_ms: float = 5):
+        self.embeddings = embeddings
+        self._batcher = AsyncBatcher(embeddings.aembed_queries, max_batch_size, max_wait_ms)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self._batcher.submit(text)
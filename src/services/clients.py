@@ -0,0 +1,61 @@
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from langchain_community.vectorstores import Qdrant
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from embedding.embedder import GeminiEmbeddings
+from retrieval.local_index import AsyncLocalVectorIndex, LocalVectorIndex, LocalVectorStore, LOCAL_INDEX_PATH
+
+load_dotenv()
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+QDRANT_COLLECTION = "ifc_report"
+# e.g. ":memory:" or a local path to run Qdrant embedded instead of against a server.
+QDRANT_LOCATION = os.getenv("QDRANT_LOCATION")
+# "qdrant" talks to a Qdrant server (or QDRANT_LOCATION); "local" uses the in-process mmap index at LOCAL_INDEX_PATH.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+
+
+@lru_cache(maxsize=None)
+def get_local_index() -> LocalVectorIndex:
+    return LocalVectorIndex(LOCAL_INDEX_PATH)
+
+
+@lru_cache(maxsize=None)
+def get_qdrant_client() -> QdrantClient:
+    if VECTOR_BACKEND == "local":
+        return get_local_index()
+    if QDRANT_LOCATION:
+        return QdrantClient(location=QDRANT_LOCATION)
+    return QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+
+
+@lru_cache(maxsize=None)
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    # One client per process: it keeps a pooled HTTP connection open to Qdrant.
+    if VECTOR_BACKEND == "local":
+        return AsyncLocalVectorIndex(get_local_index())
+    if QDRANT_LOCATION:
+        # Embedded Qdrant: a second client would open its own empty ":memory:" store (or fail on the
+        # locked storage path), so the async side wraps the sync client's store instead.
+        return AsyncLocalVectorIndex(get_qdrant_client())
+    return AsyncQdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> GeminiEmbeddings:
+    return GeminiEmbeddings()
+
+
+def load_qdrant(collection_name: str = QDRANT_COLLECTION, embeddings=None):
+    if VECTOR_BACKEND == "local":
+        return LocalVectorStore(get_qdrant_client(), collection_name, embeddings or get_embeddings())
+    vectorstore = Qdrant(
+        client=get_qdrant_client(),
+        collection_name=collection_name,
+        embeddings=embeddings or get_embeddings()
+    )
+    return vectorstore
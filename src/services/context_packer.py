@@ -0,0 +1,105 @@
+import re
+from langchain.schema import Document
+
+CONTEXT_TOKEN_BUDGET = 6000
+DUPLICATE_JACCARD = 0.8
+SHINGLE_SIZE = 5
+
+
+def estimate_tokens(text: str) -> int:
+    # Gemini tokenizes English prose at roughly four characters per token.
+    return len(text) // 4 + 1
+
+
+def compact_text(text: str) -> str:
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+
+
+def _is_duplicate(text: str, shingles: set, seen: list) -> bool:
+    for other_text, other_shingles in seen:
+        if text in other_text or other_text in text:
+            return True
+        union = len(shingles | other_shingles)
+        if union and len(shingles & other_shingles) / union >= DUPLICATE_JACCARD:
+            return True
+    return False
+
+
+def _citation(metadata: dict) -> str:
+    parts = [f"p. {metadata.get('page', '?')}", metadata.get("type", "text")]
+    label = metadata.get("title") or metadata.get("section")
+    if label and label != "Unknown":
+        parts.append(label)
+    return "[" + " | ".join(str(p) for p in parts) + "]"
+
+
+def parse_table_row(text: str):
+    lines = [line.strip() for line in text.splitlines()]
+    if "Table:" not in lines:
+        return None
+    i = lines.index("Table:")
+    table_lines = [line for line in lines[i + 1:] if line]
+    if len(table_lines) < 3:
+        return None
+    summary = next((line[len("Summary:"):].strip() for line in lines if line.startswith("Summary:")), "")
+    return {"header": table_lines[0], "separator": table_lines[1], "row": table_lines[2], "summary": summary}
+
+
+def _render_table(block: dict) -> str:
+    lines = [_citation(block["metadata"])]
+    if len(block["rows"]) == 1 and block["summary"]:
+        lines.append(block["summary"])
+    lines += [block["header"], block["separator"]] + [row for _, row in sorted(block["rows"])]
+    return "\n".join(lines)
+
+
+def pack_context(docs: list[Document], token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    blocks = []
+    tables = {}
+    seen = []
+    used = 0
+
+    for doc in docs:
+        metadata = doc.metadata
+        table_row = parse_table_row(doc.page_content) if metadata.get("type") == "table" else None
+        if table_row is not None:
+            key = (metadata.get("title"), metadata.get("page"), table_row["header"])
+            block = tables.get(key)
+            if block is not None:
+                if any(row == table_row["row"] for _, row in block["rows"]):
+                    continue
+                cost = estimate_tokens(table_row["row"])
+                if used + cost > token_budget:
+                    continue
+                block["rows"].append((metadata.get("row_index", 0), table_row["row"]))
+                used += cost
+                continue
+
+            block = {"kind": "table", "metadata": metadata, "rows": [(metadata.get("row_index", 0), table_row["row"])], **table_row}
+            cost = estimate_tokens(_render_table(block))
+            if used + cost > token_budget:
+                continue
+            tables[key] = block
+            blocks.append(block)
+            used += cost
+            continue
+
+        text = compact_text(doc.page_content)
+        shingles = _shingles(text)
+        if not text or _is_duplicate(text, shingles, seen):
+            continue
+        rendered = f"{_citation(metadata)}\n{text}"
+        cost = estimate_tokens(rendered)
+        if used + cost > token_budget:
+            continue
+        seen.append((text, shingles))
+        blocks.append({"kind": "text", "rendered": rendered})
+        used += cost
+
+    return "\n\n".join(_render_table(b) if b["kind"] == "table" else b["rendered"] for b in blocks)
@@ -5,11 +5,13 @@ load_dotenv()
 from langfuse import observe
 from google.genai import types
 import json
-import io
-from PIL import Image
+import logging
 from pydantic import BaseModel
 from langchain.schema import Document
 from typing import Optional, Literal
+from services.answers import NO_ANSWER_MESSAGES, is_no_answer, may_be_no_answer
+from services.context_packer import pack_context, estimate_tokens, CONTEXT_TOKEN_BUDGET
+from services.rate_limit import TokenBucket, acall_with_retry
 
 
 client = genai.Client(
@@ -17,12 +19,15 @@ client = genai.Client(
     project=os.getenv("PROJECT_ID"),
     location=os.getenv("LOCATION")
 )
+# Shared by the async calls the API server makes per request, so one 429 backs off instead of failing.
+GEMINI_RPS = float(os.getenv("GEMINI_RPS", "10.0"))
+bucket = TokenBucket(GEMINI_RPS)
 
 
-@observe(as_type="generation")
-def call_gemini(docs: list[Document], user_query: str) -> str:
-    context = "\n\n".join(str(doc) for doc in docs)
-    response = client.models.generate_content(
+def _answer_request(docs: list[Document], user_query: str, token_budget: int = CONTEXT_TOKEN_BUDGET) -> dict:
+    context = pack_context(docs, token_budget)
+    logging.info(f"Packed {len(docs)} chunks into ~{estimate_tokens(context)} context tokens")
+    return dict(
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             temperature=0.3,
@@ -35,18 +40,43 @@ def call_gemini(docs: list[Document], user_query: str) -> str:
         contents=f"""Answer the question based strictly on the following context:\n\n{context}\n\nQuestion: {user_query}"""
     )
 
+
+@observe(as_type="generation")
+def call_gemini(docs: list[Document], user_query: str, token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    response = client.models.generate_content(**_answer_request(docs, user_query, token_budget))
+    return response.text
+
+
+@observe(as_type="generation")
+async def call_gemini_async(docs: list[Document], user_query: str, token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    response = await acall_with_retry(client.aio.models.generate_content, **_answer_request(docs, user_query, token_budget), bucket=bucket)
     return response.text
 
 
+@observe(as_type="generation")
+async def call_gemini_stream_async(docs: list[Document], user_query: str, token_budget: int = CONTEXT_TOKEN_BUDGET):
+    # Only opening the stream is retried; chunks already yielded cannot be taken back.
+    stream = await acall_with_retry(client.aio.models.generate_content_stream, **_answer_request(docs, user_query, token_budget), bucket=bucket)
+    async for chunk in stream:
+        if chunk.text:
+            yield chunk.text
+
+
+@observe(as_type="generation")
+def call_gemini_stream(docs: list[Document], user_query: str, token_budget: int = CONTEXT_TOKEN_BUDGET):
+    for chunk in client.models.generate_content_stream(**_answer_request(docs, user_query, token_budget)):
+        if chunk.text:
+            yield chunk.text
+
+
 class Metadata(BaseModel):
     query: str
     page_start: Optional[int] = None
     page_end: Optional[int] = None
     content_type: Optional[Literal["text", "image", "table"]] = None
 
-@observe(as_type="generation")
-def return_metadata(user_query: str):
-    response = client.models.generate_content(
+def _metadata_request(user_query: str) -> dict:
+    return dict(
         model="gemini-2.0-flash",
         contents=f"""
 You are a helpful assistant that extracts structured metadata from a user query.
@@ -71,14 +101,27 @@ User query: {user_query}
             "response_schema": Metadata,
         }
     )
-    metadata = json.loads(response.text)
-    metadata = Metadata(**metadata)
+
+
+def _parse_metadata(response_text: str):
+    metadata = Metadata(**json.loads(response_text))
     return metadata.query, metadata.page_start, metadata.page_end, metadata.content_type
 
 
 @observe(as_type="generation")
-def summarize_image(image_bytes, title):
-    image = Image.open(io.BytesIO(image_bytes))
+def return_metadata(user_query: str):
+    response = client.models.generate_content(**_metadata_request(user_query))
+    return _parse_metadata(response.text)
+
+
+@observe(as_type="generation")
+async def return_metadata_async(user_query: str):
+    response = await acall_with_retry(client.aio.models.generate_content, **_metadata_request(user_query), bucket=bucket)
+    return _parse_metadata(response.text)
+
+
+@observe(as_type="generation")
+def summarize_image(image_bytes, title, mime_type="image/png"):
     prompt = f"""
     You are an expert analyst specialized in describing **data visualizations and diagrams** (such as charts, plots, and schematics).
 
@@ -112,7 +155,7 @@ def summarize_image(image_bytes, title):
         model="gemini-2.0-flash",
         contents=[
             types.Part(text=prompt),
-            types.Part(inline_data={"mime_type": "image/png", "data": image_bytes}),
+            types.Part(inline_data={"mime_type": mime_type, "data": image_bytes}),
         ]
     )
     return response.text
@@ -136,4 +179,57 @@ Write a concise 1–2 sentence summary of what this table represents and what th
     return response.text.strip()
 
 
+class RowSummary(BaseModel):
+    row_index: int
+    summary: str
+
 
+@observe(as_type="generation")
+def summarize_table_rows(title: str, headers: list[str], rows: list[list[str]]) -> list[Optional[str]]:
+    rows_text = "\n".join(f"{i}: {' | '.join(row)}" for i, row in enumerate(rows))
+    prompt = f"""
+You are an expert analyst summarizing rows of a table.
+
+Title: {title}
+Headers: {' | '.join(headers)}
+Rows (row_index: values):
+{rows_text}
+
+For EVERY row above, write a concise 1–2 sentence summary of what the row represents and what the user can learn from it.
+Return one object per row with its row_index, in the same order.
+"""
+    response = client.models.generate_content(
+        model="gemini-2.0-flash",
+        contents=[types.Part(text=prompt)],
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": list[RowSummary],
+        }
+    )
+    summaries = [None] * len(rows)
+    try:
+        items = [RowSummary(**item) for item in json.loads(response.text)]
+    except Exception:
+        return summaries
+    for item in items:
+        if 0 <= item.row_index < len(rows) and item.summary.strip():
+            summaries[item.row_index] = item.summary.strip()
+    return summaries
+
+
+@observe(as_type="generation")
+def summarize_passage(level: str, label: str, text: str) -> str:
+    prompt = f"""
+You are an expert analyst indexing the IFC Annual Report 2024 financials.
+
+Below is the full content of one {level} ({label}), including text passages and table rows.
+
+{text}
+
+Write a dense 3–5 sentence summary of what this {level} covers: its topics, the financial statements or notes it contains, and the key figures and terms a reader might search for.
+"""
+    response = client.models.generate_content(
+        model="gemini-2.0-flash",
+        contents=[types.Part(text=prompt)]
+    )
+    return response.text.strip()
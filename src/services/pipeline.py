@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+
+from embedding.incremental import collection_version
+from retrieval.intent import local_metadata, remember_metadata
+from retrieval.rerank import cascade_rerank
+from retrieval.retriever import (
+    COARSE_TO_FINE,
+    DENSE_K,
+    HYBRID_K,
+    RETRIEVAL_MODE,
+    acoarse_to_fine_search,
+    ahybrid_search_by_vector,
+    asearch_by_vector,
+)
+from services import clients
+from services.answer_cache import AnswerCache
+from services.answers import is_no_answer
+from services.gemini import call_gemini_async, call_gemini_stream_async, return_metadata_async
+
+
+class QueryPipeline:
+    def __init__(
+        self,
+        client=None,
+        embeddings=None,
+        collection_name: str = clients.QDRANT_COLLECTION,
+        answer_cache: AnswerCache = None,
+        rerank_enabled: bool = True,
+        k: int = None,
+        retrieval_mode: str = RETRIEVAL_MODE,
+        top_k: int = 10,
+        coarse_to_fine: bool = COARSE_TO_FINE,
+        generate_fn=call_gemini_async,
+        stream_fn=call_gemini_stream_async,
+        metadata_fn=return_metadata_async,
+        rerank_fn=cascade_rerank,
+    ):
+        self.client = client or clients.get_async_qdrant_client()
+        self.embeddings = embeddings or clients.get_embeddings()
+        self.collection_name = collection_name
+        self.answer_cache = answer_cache
+        self.rerank_enabled = rerank_enabled
+        self.retrieval_mode = retrieval_mode
+        self.k = k or (HYBRID_K if retrieval_mode == "hybrid" else DENSE_K)
+        self.top_k = top_k
+        self.coarse_to_fine = coarse_to_fine
+        self.generate_fn = generate_fn
+        self.stream_fn = stream_fn
+        self.metadata_fn = metadata_fn
+        self.rerank_fn = rerank_fn
+
+    async def _metadata(self, user_query: str):
+        metadata = local_metadata(user_query)
+        if metadata is None:
+            metadata = await self.metadata_fn(user_query)
+            remember_metadata(user_query, metadata)
+        return metadata
+
+    async def _search(self, vector, user_query: str, page_start, page_end, type_):
+        # An explicit page range from the query already narrows the search better than summaries would.
+        if self.coarse_to_fine and page_start is None and page_end is None:
+            results = await acoarse_to_fine_search(
+                self.client, self.collection_name, vector, user_query, type_, mode=self.retrieval_mode
+            )
+            if results is not None:
+                return results
+        if self.retrieval_mode == "hybrid":
+            return await ahybrid_search_by_vector(
+                self.client, self.collection_name, vector, user_query, page_start, page_end, type_, self.k
+            )
+        return await asearch_by_vector(self.client, self.collection_name, vector, page_start, page_end, type_, self.k)
+
+    async def retrieve(self, user_query: str, timings: dict = None, vector=None):
+        timings = timings if timings is not None else {}
+        start = time.perf_counter()
+        if vector is None:
+            # Embedding and (if needed) LLM intent extraction are independent, so run them together.
+            vector, metadata = await asyncio.gather(self.embeddings.aembed_query(user_query), self._metadata(user_query))
+            timings["embed_and_intent"] = time.perf_counter() - start
+        else:
+            metadata = await self._metadata(user_query)
+            timings["intent"] = time.perf_counter() - start
+
+        _, page_start, page_end, type_ = metadata
+        start = time.perf_counter()
+        results = await self._search(vector, user_query, page_start, page_end, type_)
+        timings["search"] = time.perf_counter() - start
+        return vector, metadata, results
+
+    async def _prepare(self, user_query: str, timings: dict) -> dict:
+        vector = None
+        if self.answer_cache is not None:
+            # Embed through self.embeddings so concurrent requests share a batch; the cache lookup
+            # and retrieval both reuse this vector.
+            start = time.perf_counter()
+            vector = await self.embeddings.aembed_query(user_query)
+            timings["embed"] = time.perf_counter() - start
+            start = time.perf_counter()
+            cached = await asyncio.to_thread(self.answer_cache.get, user_query, vector)
+            timings["answer_cache"] = time.perf_counter() - start
+            if cached is not None:
+                return {"answer": cached["answer"], "chunks": cached["chunks"], "cached": True}
+
+        return {**await self.context(user_query, timings, vector), "cached": False}
+
+    async def context(self, user_query: str, timings: dict = None, vector=None) -> dict:
+        timings = timings if timings is not None else {}
+        vector, metadata, results = await self.retrieve(user_query, timings, vector)
+        if not results:
+            return {"answer": None, "chunks": [], "metadata": metadata, "vector": vector}
+
+        start = time.perf_counter()
+        if self.rerank_enabled:
+            chunks = await asyncio.to_thread(self.rerank_fn, user_query, results, self.top_k)
+        else:
+            chunks = [doc for doc, _ in results][:self.top_k]
+        timings["rerank"] = time.perf_counter() - start
+        return {"chunks": chunks, "metadata": metadata, "vector": vector}
+
+    def _finish(self, user_query: str, prepared: dict, answer: str, timings: dict, total_start: float):
+        timings["total"] = time.perf_counter() - total_start
+        if self.answer_cache is not None and not is_no_answer(answer):
+            self.answer_cache.put(user_query, answer, prepared["chunks"], vector=prepared["vector"])
+        logging.info(f"Answered in {timings['total']:.2f}s: {({stage: round(s, 3) for stage, s in timings.items()})}")
+
+    async def answer(self, user_query: str) -> dict:
+        timings = {}
+        total_start = time.perf_counter()
+        prepared = await self._prepare(user_query, timings)
+        if prepared["cached"] or not prepared["chunks"]:
+            return {**prepared, "timings": timings}
+
+        start = time.perf_counter()
+        answer = await self.generate_fn(prepared["chunks"], user_query)
+        timings["generate"] = time.perf_counter() - start
+        self._finish(user_query, prepared, answer, timings, total_start)
+        return {"answer": answer, "chunks": prepared["chunks"], "metadata": prepared["metadata"], "cached": False, "timings": timings}
+
+    async def answer_stream(self, user_query: str):
+        timings = {}
+        total_start = time.perf_counter()
+        prepared = await self._prepare(user_query, timings)
+        yield {"type": "chunks", "chunks": prepared["chunks"], "cached": prepared["cached"]}
+        if prepared["cached"]:
+            yield {"type": "delta", "text": prepared["answer"]}
+            yield {"type": "done", "timings": timings}
+            return
+        if not prepared["chunks"]:
+            yield {"type": "done", "timings": timings}
+            return
+
+        start = time.perf_counter()
+        answer = ""
+        async for part in self.stream_fn(prepared["chunks"], user_query):
+            if not answer:
+                timings["first_token"] = time.perf_counter() - start
+            answer += part
+            yield {"type": "delta", "text": part}
+        timings["generate"] = time.perf_counter() - start
+        self._finish(user_query, prepared, answer, timings, total_start)
+        yield {"type": "done", "timings": timings}
+
+
+_default_pipeline = None
+
+
+def get_pipeline(embeddings=None) -> QueryPipeline:
+    global _default_pipeline
+    if _default_pipeline is None:
+        embeddings = embeddings or clients.get_embeddings()
+        sync_client = clients.get_qdrant_client()
+        answer_cache = AnswerCache(
+            embeddings,
+            version_fn=lambda: collection_version(sync_client, clients.QDRANT_COLLECTION),
+        )
+        _default_pipeline = QueryPipeline(embeddings=embeddings, answer_cache=answer_cache)
+    return _default_pipeline
+
+
+async def answer(query: str) -> dict:
+    return await get_pipeline().answer(query)
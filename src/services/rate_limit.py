@@ -0,0 +1,62 @@
+import asyncio
+import random
+import threading
+import time
+import logging
+
+from google.genai import errors
+
+RETRYABLE_CODES = {429, 500, 503}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, errors.APIError) and error.code in RETRYABLE_CODES
+
+
+def call_with_retry(fn, *args, bucket: TokenBucket = None, max_retries: int = 5, base_delay: float = 1.0, **kwargs):
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = base_delay * (2 ** attempt) + random.uniform(0, base_delay)
+            logging.warning(f"Retryable error ({e}), retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+async def acall_with_retry(fn, *args, bucket: TokenBucket = None, max_retries: int = 5, base_delay: float = 1.0, **kwargs):
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            await asyncio.to_thread(bucket.acquire)
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = base_delay * (2 ** attempt) + random.uniform(0, base_delay)
+            logging.warning(f"Retryable error ({e}), retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            await asyncio.sleep(delay)
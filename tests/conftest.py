@@ -0,0 +1,6 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+# services.gemini builds its client at import time; no test reaches the API.
+os.environ.setdefault("GOOGLE_API_KEY", "test")
@@ -0,0 +1,61 @@
+import numpy as np
+
+from services.answer_cache import AnswerCache, query_signature
+
+
+class ConstantEmbeddings:
+    """Embeds every query to the same vector, so only the cache's own checks tell questions apart."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [1.0, 0.0, 0.0]
+
+
+def cache_with(question):
+    cache = AnswerCache(ConstantEmbeddings())
+    cache.put(question, "answer", [])
+    return cache
+
+
+def test_exact_and_near_duplicate_questions_hit():
+    cache = cache_with("What was net income on page 12?")
+    assert cache.get("what was net income on page 12")["answer"] == "answer"
+    assert cache.get("What was the net income on page 12?")["answer"] == "answer"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_different_page_misses():
+    cache = cache_with("What was net income on page 12?")
+    assert cache.get("What was net income on page 13?") is None
+
+
+def test_different_year_misses():
+    cache = cache_with("What was net income in 2024?")
+    assert cache.get("What was net income in 2023?") is None
+
+
+def test_different_content_type_misses():
+    cache = cache_with("Show the table of net income")
+    assert cache.get("Show the chart of net income") is None
+
+
+def test_vague_questions_only_hit_exactly():
+    cache = cache_with("What is on the last page?")
+    assert cache.get("What is on the first page?") is None
+    assert cache.get("what is on the last page")["answer"] == "answer"
+
+
+def test_signature_ignores_thousands_separators():
+    assert query_signature("Which loans exceed 1,485 million?") == query_signature("Which loans exceed 1485 million?")
+
+
+def test_given_vector_is_used_instead_of_embedding():
+    cache = cache_with("What was net income on page 12?")
+    embeddings = cache.embeddings
+    calls = embeddings.calls
+    assert cache.get("What was the net income on page 12?", np.array([2.0, 0.0, 0.0])) is not None
+    assert embeddings.calls == calls
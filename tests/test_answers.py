@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+from services.answers import is_no_answer, may_be_no_answer
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+def test_no_answer_matching():
+    assert is_no_answer("  The document does not provide this information.\n")
+    assert not is_no_answer("The document does not provide this information, but page 4 does.")
+    assert may_be_no_answer("The document")
+    assert not may_be_no_answer("Net income was")
+
+
+def test_imports_without_gemini_credentials():
+    # The Streamlit client imports this module and must start without Gemini credentials.
+    env = {k: v for k, v in os.environ.items() if k not in ("GOOGLE_API_KEY", "GEMINI_API_KEY")}
+    code = "import sys; import services.answers; assert 'google.genai' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=SRC, env=env, check=True)
@@ -0,0 +1,62 @@
+import sys
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from evaluation import benchmark_retrieval
+from evaluation.benchmark_retrieval import CONFIGS, page_window, run_config, sample_metrics
+
+COLLECTION = "benchmark_test"
+
+
+@pytest.fixture(scope="module")
+def client():
+    rng = np.random.default_rng(0)
+    client = QdrantClient(location=":memory:")
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+    pages = np.arange(1, 101)
+    client.upload_collection(
+        COLLECTION,
+        vectors=rng.normal(size=(len(pages), 8)),
+        payload=[{"page_content": f"page {page}", "metadata": {"page": int(page), "type": "text"}} for page in pages],
+        ids=list(range(len(pages))),
+    )
+    return client
+
+
+def test_page_window_around_single_page():
+    assert page_window({"Page_Number": "1"}) == (1, 3, None)
+    assert page_window({"Page_Number": 9}) == (7, 11, None)
+
+
+def test_page_window_covers_each_listed_page():
+    assert page_window({"Page_Number": "14; 86"}) == (None, None, (12, 13, 14, 15, 16, 84, 85, 86, 87, 88))
+
+
+@pytest.mark.parametrize("config", ["page_window_hnsw", "page_window_auto"])
+def test_page_window_configs_run_on_multi_page_rows(client, config):
+    row = {"Question": "net income", "Page_Number": "14; 86", "Context_Content_Type": "table (multi-page)"}
+    docs, _, filtered = run_config(client, COLLECTION, row, np.ones(8), CONFIGS[config])
+    assert filtered
+    assert docs
+    assert {doc.metadata["page"] for doc in docs} <= {12, 13, 14, 15, 16, 84, 85, 86, 87, 88}
+
+
+def test_sample_metrics_count_any_labelled_page():
+    row = {"Page_Number": "4; 8", "Context_Content_Type": "combination (table and text)"}
+    docs = [Document(page_content="", metadata={"page": 3, "type": "text"}), Document(page_content="", metadata={"page": 8, "type": "table"})]
+    metrics = sample_metrics(docs, row)
+    assert metrics["recall@1"] == 0.0
+    assert metrics["recall@5"] == 1.0
+    assert metrics["mrr"] == 0.5
+    assert metrics["type_recall"] == 1.0
+
+
+def test_profiles_refuse_embedded_snapshot(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["benchmark_retrieval.py", "--source", "snapshot", "--profiles", "int8"])
+    with pytest.raises(SystemExit):
+        benchmark_retrieval.main()
+    assert "needs a Qdrant server" in capsys.readouterr().err
@@ -0,0 +1,38 @@
+import hashlib
+
+import numpy as np
+from langchain.schema import Document
+
+from parsing import chunking
+from parsing.chunking import grouped_percentile, semantic_chunk_documents
+
+
+class HashEmbeddings:
+    def embed_documents_array(self, texts):
+        rows = []
+        for text in texts:
+            seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+            rows.append(np.random.default_rng(seed).normal(size=16))
+        return np.asarray(rows, dtype=np.float32)
+
+
+def test_grouped_percentile_matches_numpy():
+    rng = np.random.default_rng(0)
+    values = rng.random(50)
+    groups = rng.integers(0, 4, size=50)
+    groups[groups == 2] = 3
+    result = grouped_percentile(values, groups, 5, 95)
+    for g in (0, 1, 3):
+        assert np.isclose(result[g], np.percentile(values[groups == g], 95))
+    assert np.isinf(result[2]) and np.isinf(result[4])
+
+
+def test_chunks_do_not_depend_on_batch(monkeypatch):
+    monkeypatch.setattr(chunking, "get_local_embeddings", lambda model_name: HashEmbeddings())
+    doc = Document(page_content=" ".join(f"Sentence number {i} about topic {i % 5}." for i in range(30)), metadata={"page": 1})
+    other = Document(page_content=" ".join(f"Another line {i} on subject {i % 3}!" for i in range(40)), metadata={"page": 2})
+
+    alone = semantic_chunk_documents([doc], breakpoint_percentile=80)
+    batched = semantic_chunk_documents([other, doc], breakpoint_percentile=80)
+    assert len(alone) > 1
+    assert [c.page_content for c in batched if c.metadata["page"] == 1] == [c.page_content for c in alone]
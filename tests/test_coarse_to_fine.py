@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from retrieval.local_index import LocalVectorIndex
+from retrieval.retriever import coarse_to_fine_search, summary_alias
+
+COLLECTION = "coarse_test"
+
+
+def fill(client, with_summaries: bool):
+    rng = np.random.default_rng(0)
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+    client.upload_collection(
+        COLLECTION,
+        vectors=rng.normal(size=(40, 8)),
+        payload=[{"page_content": f"chunk {i}", "metadata": {"page": i % 10 + 1, "type": "text"}} for i in range(40)],
+        ids=list(range(40)),
+    )
+    if with_summaries:
+        client.create_collection(summary_alias(COLLECTION), vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+        client.upload_collection(
+            summary_alias(COLLECTION),
+            vectors=np.array([np.ones(8), -np.ones(8)]),
+            payload=[
+                {"page_content": "Section: Loans", "metadata": {"level": "section", "page": 3, "pages": [3, 4], "type": "summary"}},
+                {"page_content": "Page: page 9", "metadata": {"level": "page", "page": 9, "pages": [9], "type": "summary"}},
+            ],
+            ids=[0, 1],
+        )
+    return client
+
+
+@pytest.fixture(params=["qdrant", "local"])
+def make_client(request, tmp_path):
+    return lambda with_summaries: fill(QdrantClient(location=":memory:") if request.param == "qdrant" else LocalVectorIndex(str(tmp_path)), with_summaries)
+
+
+def test_fine_search_is_restricted_to_summary_pages(make_client):
+    client = make_client(True)
+    results = coarse_to_fine_search(client, COLLECTION, np.ones(8), "loans", k=10, coarse_k=1, mode="dense")
+    assert results
+    assert {doc.metadata["page"] for doc, _ in results} <= {3, 4}
+
+
+def test_missing_summary_index_falls_back(make_client):
+    client = make_client(False)
+    assert coarse_to_fine_search(client, COLLECTION, np.ones(8), "loans", mode="dense") is None
+
+
+def test_other_errors_are_raised(make_client):
+    client = make_client(True)
+    with pytest.raises(ValueError):
+        # Wrong vector size: a real failure, not a missing summary index.
+        coarse_to_fine_search(client, COLLECTION, np.ones(3), "loans", mode="dense")
@@ -0,0 +1,59 @@
+from langchain.schema import Document
+
+from services.context_packer import estimate_tokens, pack_context
+
+
+def table_row(row, page=3, row_index=0, title="Revenue"):
+    content = f"Title: {title}\nSummary: Revenue by year\nTable:\n| Year | Revenue |\n| --- | --- |\n{row}"
+    return Document(page_content=content, metadata={"page": page, "type": "table", "title": title, "row_index": row_index})
+
+
+def text(content, page=1, **metadata):
+    return Document(page_content=content, metadata={"page": page, "type": "text", **metadata})
+
+
+def test_cites_page_type_and_section():
+    packed = pack_context([text("Net income   rose.", page=4, section="Results")])
+    assert packed == "[p. 4 | text | Results]\nNet income rose."
+
+
+def test_drops_duplicate_and_contained_chunks():
+    sentence = "The company reported record revenue across all of its operating segments this year"
+    packed = pack_context([
+        text(sentence, page=1),
+        text(sentence + ".", page=2),
+        text(sentence[:60], page=3),
+        text("An unrelated paragraph about the board of directors and its committees.", page=4),
+    ])
+    assert packed.count("record revenue") == 1
+    assert "[p. 4 | text]" in packed
+
+
+def test_merges_rows_of_one_table_under_a_single_header():
+    packed = pack_context([
+        table_row("| 2023 | 12 |", row_index=1),
+        table_row("| 2022 | 10 |", row_index=0),
+        table_row("| 2023 | 12 |", row_index=1),
+    ])
+    assert packed.count("| Year | Revenue |") == 1
+    assert packed.index("| 2022 | 10 |") < packed.index("| 2023 | 12 |")
+    assert packed.count("| 2023 | 12 |") == 1
+    # The summary only describes the table when a single row is shown.
+    assert "Revenue by year" not in packed
+
+
+def test_single_table_row_keeps_summary():
+    packed = pack_context([table_row("| 2022 | 10 |")])
+    assert packed.splitlines()[:2] == ["[p. 3 | table | Revenue]", "Revenue by year"]
+
+
+def test_respects_token_budget_and_skips_oversized_chunks():
+    small = text("Short answer.", page=1)
+    large = text("word " * 400, page=2)
+    later = text("Another short note.", page=3)
+    budget = estimate_tokens("[p. 1 | text]\nShort answer.") + estimate_tokens("[p. 3 | text]\nAnother short note.")
+
+    packed = pack_context([small, large, later], token_budget=budget)
+    assert "[p. 2" not in packed
+    assert "Short answer." in packed and "Another short note." in packed
+    assert estimate_tokens(packed) <= budget + 1
@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+from google.genai import errors
+
+from embedding.cache import EmbeddingCache
+from embedding.embedder import GeminiEmbeddings
+from services import rate_limit
+
+
+class FlakyModels:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = []
+
+    async def embed_content(self, model, contents, config):
+        self.calls.append(list(contents))
+        if len(self.calls) <= self.failures:
+            raise errors.APIError(429, {"error": {"code": 429, "message": "quota", "status": "RESOURCE_EXHAUSTED"}})
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=[float(len(t)), 1.0]) for t in contents])
+
+
+def flaky_client(failures):
+    return SimpleNamespace(aio=SimpleNamespace(models=FlakyModels(failures)))
+
+
+def test_aembed_queries_retries_rate_limited_batches(monkeypatch):
+    async def asleep(_):
+        return None
+
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", asleep)
+    client = flaky_client(failures=2)
+    embeddings = GeminiEmbeddings(client=client, use_cache=False, requests_per_second=1000)
+
+    vectors = asyncio.run(embeddings.aembed_queries(["a", "bb", "a"]))
+    np.testing.assert_array_equal(vectors[:, 0], [1.0, 2.0, 1.0])
+    assert len(client.aio.models.calls) == 3
+    assert client.aio.models.calls[-1] == ["a", "bb"]
+
+
+def test_aembed_queries_serves_repeats_from_cache(tmp_path):
+    client = flaky_client(failures=0)
+    embeddings = GeminiEmbeddings(client=client, cache=EmbeddingCache(str(tmp_path / "cache.sqlite")), requests_per_second=1000)
+
+    first = asyncio.run(embeddings.aembed_queries(["a", "bb"]))
+    second = asyncio.run(embeddings.aembed_queries(["bb", "a"]))
+    np.testing.assert_array_equal(second, first[::-1])
+    assert client.aio.models.calls == [["a", "bb"]]
@@ -0,0 +1,114 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+from qdrant_client import QdrantClient
+
+from embedding.incremental import IncrementalIndexer, collection_version, point_id
+from retrieval.local_index import LocalVectorIndex
+
+
+class HashEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents_array(self, texts):
+        self.embedded.extend(texts)
+        return np.asarray([self._vector(t) for t in texts], dtype=np.float32)
+
+    def embed_query(self, text):
+        return self._vector(text).tolist()
+
+    @staticmethod
+    def _vector(text):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).normal(size=8)
+
+
+def documents(texts):
+    docs = {point_id("text", t): Document(page_content=t, metadata={"page": i, "type": "text"}) for i, t in enumerate(texts)}
+    return list(docs), docs
+
+
+@pytest.fixture(params=["qdrant", "local"])
+def client(request, tmp_path):
+    return QdrantClient(":memory:") if request.param == "qdrant" else LocalVectorIndex(str(tmp_path / "index"))
+
+
+def make_indexer(client, tmp_path, embeddings, profile="float32"):
+    return IncrementalIndexer(client, embeddings, alias="docs", manifest_path=str(tmp_path / "manifest.json"), profile=profile)
+
+
+def stored_ids(client):
+    records, _ = client.scroll("docs", limit=100)
+    return {str(r.id) for r in records}
+
+
+def test_changes_are_applied_in_place(client, tmp_path):
+    embeddings = HashEmbeddings()
+    ids, docs = documents(["a", "b", "c"])
+    make_indexer(client, tmp_path, embeddings).sync("text", ids, docs)
+    collection = collection_version(client, "docs", str(tmp_path / "manifest.json"))
+
+    embeddings.embedded.clear()
+    ids, docs = documents(["a", "b", "d"])
+    stats = make_indexer(client, tmp_path, embeddings).sync("text", ids, docs)
+
+    assert stats == {"source": "text", "added": 1, "removed": 1, "unchanged": 2}
+    assert embeddings.embedded == ["d"]
+    assert stored_ids(client) == set(ids)
+    new_version = collection_version(client, "docs", str(tmp_path / "manifest.json"))
+    assert new_version.split("@")[0] == collection.split("@")[0]
+    assert new_version != collection
+
+
+def test_profile_change_rebuilds_collection(tmp_path):
+    client = QdrantClient(":memory:")
+    ids, docs = documents(["a", "b"])
+    make_indexer(client, tmp_path, HashEmbeddings()).sync("text", ids, docs)
+    before = client.get_aliases().aliases[0].collection_name
+
+    make_indexer(client, tmp_path, HashEmbeddings(), profile="int8").sync("text", ids, docs)
+    after = client.get_aliases().aliases[0].collection_name
+    assert after != before
+    assert not client.collection_exists(before)
+    assert stored_ids(client) == set(ids)
+
+
+def test_failed_rebuild_leaves_no_orphan_collection(tmp_path):
+    client = QdrantClient(":memory:")
+    ids, _ = documents(["a", "b"])
+
+    def broken():
+        raise RuntimeError("table extraction failed")
+        yield
+
+    with pytest.raises(RuntimeError):
+        make_indexer(client, tmp_path, HashEmbeddings()).sync("text", ids, broken())
+    assert client.get_collections().collections == []
+
+
+def test_failed_in_place_sync_records_written_points(client, tmp_path, monkeypatch):
+    monkeypatch.setattr("embedding.incremental.UPSERT_BATCH_SIZE", 1)
+    ids, docs = documents(["a"])
+    make_indexer(client, tmp_path, HashEmbeddings()).sync("text", ids, docs)
+
+    new_ids, new_docs = documents(["b", "c"])
+
+    def partial():
+        yield new_ids[0], new_docs[new_ids[0]]
+        raise RuntimeError("table extraction failed")
+
+    with pytest.raises(RuntimeError):
+        make_indexer(client, tmp_path, HashEmbeddings()).sync("text", new_ids, partial())
+
+    embeddings = HashEmbeddings()
+    stats = make_indexer(client, tmp_path, embeddings).sync("text", new_ids, new_docs)
+    assert embeddings.embedded == ["c"]
+    assert stats["removed"] == 1
+    assert stored_ids(client) == set(new_ids)
+
+
+def test_collection_version_without_index(tmp_path):
+    assert collection_version(QdrantClient(":memory:"), "docs", str(tmp_path / "manifest.json")) == "docs"
@@ -0,0 +1,38 @@
+import pytest
+
+from retrieval.intent import parse_intent
+
+
+@pytest.mark.parametrize("query, pages", [
+    ("What is on page 12?", (12, 12)),
+    ("Summarize pages 12", (12, 12)),
+    ("What does p. 7 say about loans?", (7, 7)),
+    ("Compare pages 4-6", (4, 6)),
+    ("Compare pages 10 to 8", (8, 10)),
+    ("What do pages 5 and 6 show?", (5, 6)),
+    ("What do pages 4, 5 and 6 cover?", (4, 6)),
+    ("Compare pages 4 and 70", (None, None)),
+    ("Compare pp. 3, 9 & 12", (None, None)),
+    ("What was net income on page 12 in 2024?", (12, 12)),
+    ("What was net income in 2024?", (None, None)),
+])
+def test_page_filters(query, pages):
+    _, page_start, page_end, _ = parse_intent(query)
+    assert (page_start, page_end) == pages
+
+
+def test_scattered_pages_keep_the_type_filter():
+    assert parse_intent("Show the tables on pages 4 and 70") == ("Show the tables on pages 4 and 70", None, None, "table")
+
+
+def test_vague_page_reference_is_left_to_the_llm():
+    assert parse_intent("What is on the last page?") is None
+
+
+@pytest.mark.parametrize("query, type_", [
+    ("Show the figures on page 5", "image"),
+    ("Show the figure on page 5", "image"),
+    ("List the rows of the table on page 5", "table"),
+])
+def test_type_keywords_accept_plurals(query, type_):
+    assert parse_intent(query)[3] == type_
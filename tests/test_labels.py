@@ -0,0 +1,34 @@
+from langchain.schema import Document
+
+from evaluation.labels import expected_pages, expected_types, is_hit, is_type_hit
+
+
+def doc(page, type_="text"):
+    return Document(page_content="", metadata={"page": page, "type": type_})
+
+
+def test_multi_page_labels_match_any_listed_page():
+    row = {"Page_Number": "4; 5; 6", "Context_Content_Type": "text (multi-page)"}
+    assert expected_pages(row) == {4, 5, 6}
+    assert is_hit(doc(5), row)
+    assert not is_hit(doc(7), row)
+    assert not is_hit(doc(None), row)
+
+
+def test_single_page_label_accepts_numeric_cells():
+    assert is_hit(doc(9), {"Page_Number": 9, "Context_Content_Type": "text"})
+    assert is_hit(doc("9"), {"Page_Number": "9", "Context_Content_Type": "text"})
+
+
+def test_content_type_labels_map_to_index_types():
+    assert expected_types({"Context_Content_Type": "table (multi-page)"}) == {"table"}
+    assert expected_types({"Context_Content_Type": "Image"}) == {"image"}
+    assert expected_types({"Context_Content_Type": "combination (table and text)"}) == {"text", "table", "image"}
+    assert expected_types({"Context_Content_Type": "combination (text"}) == {"text", "table", "image"}
+
+
+def test_type_hit_requires_page_and_type():
+    row = {"Page_Number": "14; 86", "Context_Content_Type": "table (multi-page)"}
+    assert is_type_hit(doc(86, "table"), row)
+    assert not is_type_hit(doc(86, "text"), row)
+    assert not is_type_hit(doc(15, "table"), row)
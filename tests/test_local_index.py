@@ -0,0 +1,104 @@
+import uuid
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, ScalarQuantization, ScalarQuantizationConfig, ScalarType, VectorParams
+
+from embedding.vector_profiles import search_params
+from retrieval.local_index import LocalVectorIndex, _Collection
+from retrieval.retriever import build_filter
+
+
+def make_index(tmp_path, quantized=True):
+    index = LocalVectorIndex(str(tmp_path))
+    quantization = ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    index.create_collection(
+        "docs",
+        vectors_config=VectorParams(size=16, distance=Distance.COSINE),
+        quantization_config=quantization if quantized else None,
+    )
+    return index
+
+
+def payloads(start, count):
+    return [{"page_content": f"chunk {i}", "metadata": {"page": i % 7, "type": "text"}} for i in range(start, start + count)]
+
+
+def test_upsert_after_flush_searches_new_rows(tmp_path):
+    rng = np.random.default_rng(0)
+    index = make_index(tmp_path)
+    index.upload_collection("docs", vectors=rng.normal(size=(20, 16)), payload=payloads(0, 20), ids=[str(i) for i in range(20)])
+    index.flush()
+
+    new_vectors = rng.normal(size=(5, 16))
+    index.upload_collection("docs", vectors=new_vectors, payload=payloads(20, 5), ids=[str(i) for i in range(20, 25)])
+
+    for i, vector in enumerate(new_vectors):
+        hits = index.search("docs", vector, search_params=search_params("int8"), limit=3)
+        assert hits[0].id == str(20 + i)
+        assert hits[0].score > 0.999
+
+
+def test_upsert_after_flush_replaces_stale_codes(tmp_path):
+    rng = np.random.default_rng(1)
+    index = make_index(tmp_path)
+    index.upload_collection("docs", vectors=rng.normal(size=(20, 16)), payload=payloads(0, 20), ids=[str(i) for i in range(20)])
+    index.flush()
+
+    # Same row count, different vectors: a shortlist built from the old codes would miss these.
+    replaced = rng.normal(size=(20, 16))
+    index.upload_collection("docs", vectors=replaced, payload=payloads(0, 20), ids=[str(i) for i in range(20)])
+    for flushed in (False, True):
+        if flushed:
+            index.flush()
+        for i, vector in enumerate(replaced):
+            assert index.search("docs", vector, search_params=search_params("int8"), limit=1)[0].id == str(i)
+
+
+@pytest.mark.parametrize("filter_args", [
+    {"page_start": 2, "page_end": 4},
+    {"page_start": 5},
+    {"type_": "table"},
+    {"pages": (1, 3, 6)},
+    {"page_start": 1, "page_end": 5, "type_": "text"},
+    {"pages": (0, 6), "type_": "table"},
+])
+def test_filtered_search_matches_qdrant(tmp_path, filter_args):
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(60, 16))
+    rows = [{"page_content": f"chunk {i}", "metadata": {"page": i % 7, "type": "table" if i % 3 == 0 else "text"}} for i in range(60)]
+    ids = [str(uuid.UUID(int=i)) for i in range(60)]
+
+    local = make_index(tmp_path, quantized=False)
+    qdrant = QdrantClient(":memory:")
+    qdrant.create_collection("docs", vectors_config=VectorParams(size=16, distance=Distance.COSINE))
+    for client in (local, qdrant):
+        client.upload_collection("docs", vectors=vectors, payload=rows, ids=ids)
+    local.flush()
+
+    query_filter = build_filter(**filter_args)
+    query = rng.normal(size=16)
+    expected = qdrant.search("docs", query_vector=query, query_filter=query_filter, limit=10)
+    actual = local.search("docs", query, query_filter=query_filter, limit=10)
+    assert [p.id for p in actual] == [p.id for p in expected]
+    assert local.count("docs", count_filter=query_filter).count == qdrant.count("docs", count_filter=query_filter).count
+
+
+def test_batched_upserts_stack_once(tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    index = make_index(tmp_path, quantized=False)
+    builds = []
+    build_bitmaps = _Collection._build_bitmaps
+    monkeypatch.setattr(_Collection, "_build_bitmaps", staticmethod(lambda payloads: builds.append(len(payloads)) or build_bitmaps(payloads)))
+
+    vectors = rng.normal(size=(40, 16))
+    for start in range(0, 40, 8):
+        index.upload_collection("docs", vectors=vectors[start:start + 8], payload=payloads(start, 8), ids=[str(i) for i in range(start, start + 8)])
+    assert builds == []
+
+    assert index.search("docs", vectors[13], limit=1)[0].id == "13"
+    assert index.count("docs", count_filter=build_filter(page_start=0, page_end=0)).count == 6
+    index.flush()
+    assert builds == [40]
+    assert index.search("docs", vectors[37], limit=1)[0].id == "37"
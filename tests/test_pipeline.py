@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+
+import numpy as np
+import pytest
+from qdrant_client.models import Distance, VectorParams
+
+from services import clients
+from services.answer_cache import AnswerCache
+from services.batching import BatchedQueryEmbeddings
+from services.pipeline import QueryPipeline
+
+COLLECTION = "pipeline_test"
+PASSAGES = ["Net income was 1,485 million.", "Total assets grew in 2024.", "Loans to Africa increased.", "Equity investments fell."]
+
+
+def embed(text: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.lower().encode("utf-8")).digest()[:4], "little")
+    return np.random.default_rng(seed).normal(size=8).astype(np.float32)
+
+
+class StubEmbeddings:
+    """Stands in for GeminiEmbeddings; records how queries reach it."""
+
+    def __init__(self):
+        self.sync_calls = 0
+        self.batches = []
+
+    def embed_query(self, text):
+        self.sync_calls += 1
+        return embed(text)
+
+    async def aembed_queries(self, texts):
+        self.batches.append(list(texts))
+        return np.stack([embed(text) for text in texts])
+
+
+class StubGemini:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, chunks, user_query):
+        self.calls += 1
+        return f"Answer from {len(chunks)} chunks"
+
+    async def metadata(self, user_query):
+        return user_query, None, None, None
+
+
+@pytest.fixture
+def embedded_qdrant(monkeypatch):
+    monkeypatch.setattr(clients, "QDRANT_LOCATION", ":memory:")
+    monkeypatch.setattr(clients, "VECTOR_BACKEND", "qdrant")
+    clients.get_qdrant_client.cache_clear()
+    clients.get_async_qdrant_client.cache_clear()
+    sync_client = clients.get_qdrant_client()
+    sync_client.create_collection(COLLECTION, vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+    sync_client.upload_collection(
+        COLLECTION,
+        vectors=np.stack([embed(text) for text in PASSAGES]),
+        payload=[{"page_content": text, "metadata": {"page": i + 1, "type": "text"}} for i, text in enumerate(PASSAGES)],
+        ids=list(range(len(PASSAGES))),
+    )
+    yield sync_client
+    clients.get_qdrant_client.cache_clear()
+    clients.get_async_qdrant_client.cache_clear()
+
+
+def make_pipeline(base_embeddings, gemini):
+    embeddings = BatchedQueryEmbeddings(base_embeddings, max_wait_ms=20)
+    return QueryPipeline(
+        client=clients.get_async_qdrant_client(),
+        embeddings=embeddings,
+        collection_name=COLLECTION,
+        answer_cache=AnswerCache(embeddings),
+        rerank_enabled=False,
+        retrieval_mode="dense",
+        top_k=2,
+        coarse_to_fine=False,
+        generate_fn=gemini.generate,
+        metadata_fn=gemini.metadata,
+    )
+
+
+def test_sync_and_async_embedded_clients_share_one_store(embedded_qdrant):
+    async_client = clients.get_async_qdrant_client()
+    assert asyncio.run(async_client.count(collection_name=COLLECTION)).count == len(PASSAGES)
+
+
+def test_concurrent_queries_share_one_embedding_batch(embedded_qdrant):
+    base_embeddings, gemini = StubEmbeddings(), StubGemini()
+    pipeline = make_pipeline(base_embeddings, gemini)
+    questions = ["What was net income?", "How did total assets change?", "What about loans to Africa?", "Did equity investments fall?"]
+
+    async def run():
+        return await asyncio.gather(*[pipeline.answer(question) for question in questions])
+
+    results = asyncio.run(run())
+    assert base_embeddings.batches == [questions]
+    assert base_embeddings.sync_calls == 0
+    assert all(not result["cached"] and len(result["chunks"]) == 2 for result in results)
+    assert gemini.calls == len(questions)
+
+
+def test_repeated_question_is_served_from_the_answer_cache(embedded_qdrant):
+    base_embeddings, gemini = StubEmbeddings(), StubGemini()
+    pipeline = make_pipeline(base_embeddings, gemini)
+
+    first = asyncio.run(pipeline.answer("What was net income?"))
+    second = asyncio.run(pipeline.answer("what was net income"))
+    assert second["cached"]
+    assert second["answer"] == first["answer"]
+    assert gemini.calls == 1
+    assert base_embeddings.sync_calls == 0
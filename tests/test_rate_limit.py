@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from google.genai import errors
+
+from services import rate_limit
+from services.rate_limit import TokenBucket, acall_with_retry, call_with_retry
+
+
+def api_error(code):
+    return errors.APIError(code, {"error": {"code": code, "message": "boom", "status": "UNAVAILABLE"}})
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    async def asleep(_):
+        return None
+
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda _: None)
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", asleep)
+
+
+def test_bucket_allows_burst_up_to_capacity():
+    bucket = TokenBucket(rate=1000, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert bucket._tokens < 1
+
+
+def test_bucket_refills_at_rate(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    bucket = TokenBucket(rate=2, capacity=2)
+
+    for _ in range(6):
+        bucket.acquire()
+    # Two tokens up front, then four more at two per second.
+    assert clock[0] == pytest.approx(102.0)
+
+
+def test_call_with_retry_retries_retryable_errors():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise api_error(503)
+        return "ok"
+
+    assert call_with_retry(flaky, max_retries=5) == "ok"
+    assert len(calls) == 3
+
+
+def test_call_with_retry_raises_non_retryable_errors_at_once():
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise api_error(400)
+
+    with pytest.raises(errors.APIError):
+        call_with_retry(bad_request, max_retries=5)
+    assert len(calls) == 1
+
+
+def test_call_with_retry_gives_up_after_max_retries():
+    calls = []
+
+    def throttled():
+        calls.append(1)
+        raise api_error(429)
+
+    with pytest.raises(errors.APIError):
+        call_with_retry(throttled, max_retries=2)
+    assert len(calls) == 3
+
+
+def test_acall_with_retry_takes_a_token_per_attempt():
+    acquired = []
+    attempts = []
+
+    class CountingBucket:
+        def acquire(self):
+            acquired.append(1)
+
+    async def flaky(value):
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise api_error(500)
+        return value
+
+    assert asyncio.run(acall_with_retry(flaky, "ok", bucket=CountingBucket())) == "ok"
+    assert len(acquired) == len(attempts) == 2
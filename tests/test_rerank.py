@@ -0,0 +1,73 @@
+import numpy as np
+from langchain.schema import Document
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from retrieval import retriever
+from retrieval.keyword_index import BM25Index
+from retrieval.rerank import DEFAULT_CASCADE, cascade_rerank
+from retrieval.retriever import hybrid_search_by_vector, reciprocal_rank_fusion
+
+
+def doc(pid, **metadata):
+    return Document(page_content=f"chunk {pid}", metadata={"_id": pid, **metadata})
+
+
+def test_rrf_ranks_documents_found_by_both_lists_first():
+    dense = [(doc("a"), 0.9), (doc("b"), 0.8), (doc("c"), 0.7)]
+    sparse = [(doc("c"), 12.0), (doc("d"), 9.0)]
+    fused = reciprocal_rank_fusion([dense, sparse], limit=3)
+    assert [d.metadata["_id"] for d, _ in fused] == ["c", "a", "b"]
+    assert fused[0][1] == 1 / 63 + 1 / 61
+
+
+class ScoreRecorder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, query, docs):
+        self.calls += 1
+        return np.arange(len(docs), dtype=np.float32)
+
+
+def fused(vector_scores):
+    # RRF scores of a fused list: always within ~0.017 of each other, whatever the cosine gap.
+    return [(doc(i, _vector_score=score), 1 / (61 + i)) for i, score in enumerate(vector_scores)]
+
+
+def test_cascade_skips_cross_encoder_on_a_clear_dense_winner_in_hybrid_results():
+    score_fn = ScoreRecorder()
+    results = fused([0.9, 0.6, 0.55, 0.5])
+    ranked = cascade_rerank("q", results, top_k=2, config=dict(DEFAULT_CASCADE), score_fn=score_fn)
+    assert score_fn.calls == 0
+    assert ranked == [results[0][0], results[1][0]]
+
+
+def test_cascade_reranks_when_dense_scores_are_close_in_hybrid_results():
+    score_fn = ScoreRecorder()
+    cascade_rerank("q", fused([0.81, 0.8, 0.79]), top_k=2, config=dict(DEFAULT_CASCADE), score_fn=score_fn)
+    assert score_fn.calls == 1
+
+
+def test_cascade_uses_result_scores_for_dense_results():
+    score_fn = ScoreRecorder()
+    results = [(doc("a"), 0.9), (doc("b"), 0.6)]
+    assert cascade_rerank("q", results, top_k=2, config=dict(DEFAULT_CASCADE), score_fn=score_fn) == [results[0][0], results[1][0]]
+    assert score_fn.calls == 0
+
+
+def test_hybrid_search_keeps_dense_cosine_scores(tmp_path, monkeypatch):
+    client = QdrantClient(location=":memory:")
+    client.create_collection("hybrid_test", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    vectors = np.eye(4)
+    payloads = [{"page_content": text, "metadata": {"page": i, "type": "text"}} for i, text in enumerate(["net income", "loans", "equity", "bonds"])]
+    client.upload_collection("hybrid_test", vectors=vectors, payload=payloads, ids=list(range(4)))
+
+    keyword_index = BM25Index("hybrid_test", index_dir=str(tmp_path))
+    keyword_index.rebuild(client, "hybrid_test")
+    monkeypatch.setattr(retriever, "get_keyword_index", lambda alias: keyword_index)
+
+    results = hybrid_search_by_vector(client, "hybrid_test", [1.0, 0.2, 0.0, 0.0], "equity", k=4)
+    by_page = {d.metadata["page"]: d.metadata for d, _ in results}
+    assert by_page[0]["_vector_score"] > 0.9
+    assert all("_vector_score" in metadata for metadata in by_page.values())